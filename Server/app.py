@@ -6,23 +6,305 @@ import traceback
 from pymysql.converters import escape_string
 from dotenv import load_dotenv
 import os
+import sys
+import time
+import tempfile
+import threading
+import uuid
+import base64
+import hashlib
+import json
+import pickle
+from decimal import Decimal
+from bisect import bisect_left
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+from multiprocessing import shared_memory
 from flask_session import Session
-from flask import Response
+from cachelib.base import BaseCache
+from flask import Response, g, has_request_context
 from flask import jsonify
 
-from sklearn.ensemble import IsolationForest
+try:
+    import pyarrow as pa
+except ImportError:  # Snapshots are optional; analytics then read from MySQL
+    pa = None
+try:
+    import orjson
+except ImportError:  # Falls back to Flask's json encoder
+    orjson = None
+try:
+    import zstandard
+except ImportError:  # gzip only
+    zstandard = None
+try:
+    import redis
+except ImportError:  # Only needed for SESSION_BACKEND=redis
+    redis = None
+import gzip
+from datetime import date, datetime
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
 from itertools import combinations
 import numpy as np
-from scipy import stats
-from sqlalchemy import text
 
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
-CORS(app, origins=["http://localhost:3000"], supports_credentials=True)
+CORS(app, origins=["http://localhost:3000"], supports_credentials=True, expose_headers=["Server-Timing", "X-Profile"])
+
+# Instrumentation. span() times a block into a process-wide histogram served
+# at /metrics and, inside a request, into that response's Server-Timing
+# header. ?profile=1 from a PROFILE_ADMINS user samples the request's stacks
+# into a folded-stack file that flamegraph.pl / speedscope read directly.
+METRICS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+PROFILE_ADMINS = {name.strip() for name in os.getenv("PROFILE_ADMINS", "").split(',') if name.strip()}
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles"))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", 0.005))  # Seconds between stack samples
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(METRICS_BUCKETS) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(METRICS_BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+
+metrics_lock = threading.Lock()
+request_histograms = {}  # (method, endpoint, status) -> Histogram
+span_histograms = {}  # span name -> Histogram
+span_state = threading.local()
+
+def observe(histograms, key, seconds):
+    with metrics_lock:
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+def record_span(name, seconds):
+    observe(span_histograms, name, seconds)
+    if has_request_context() and 'spans' in g:
+        g.spans[name] = g.spans.get(name, 0.0) + seconds
+
+@contextmanager
+def span(name):
+    active = span_state.__dict__.setdefault('active', set())
+    if name in active:
+        # Nested call of the same span (SSCursor.fetchall runs on fetchone) counts once
+        yield
+        return
+    active.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        active.discard(name)
+        record_span(name, time.perf_counter() - started)
+
+def record_timings(prefix, timings):
+    # Stage timings measured in worker threads, attributed to the calling request
+    for name, seconds in timings.items():
+        if name != 'total':
+            record_span(f"{prefix}_{name}", seconds)
+
+def label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def histogram_lines(name, help_text, histograms, label_names):
+    with metrics_lock:
+        entries = sorted((key if isinstance(key, tuple) else (key,), list(h.counts), h.sum, h.count) for key, h in histograms.items())
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for key, counts, total, count in entries:
+        labels = ','.join(f'{label}="{label_value(value)}"' for label, value in zip(label_names, key))
+        cumulative = 0
+        for bound, bucket_count in zip(METRICS_BUCKETS + ('+Inf',), counts):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f"{name}_sum{{{labels}}} {total}")
+        lines.append(f"{name}_count{{{labels}}} {count}")
+    return lines
+
+
+class SamplingProfiler:
+    """Samples the stacks of one request thread (and the analysis stage
+    workers it fans out to) until stopped, then writes them as folded stacks."""
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="profiler", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            workers = {thread.ident: thread.name for thread in threading.enumerate() if thread.name.startswith('analysis')}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != self.thread_id and thread_id not in workers:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                if thread_id in workers:
+                    stack.append(workers[thread_id])
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def stop(self, label):
+        self.stopped.set()
+        self.thread.join()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{label.strip('/').replace('/', '_') or 'root'}-{uuid.uuid4().hex[:8]}.folded"
+        with open(os.path.join(PROFILE_DIR, name), 'w') as f:
+            f.writelines(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+        return name
+
+
+@app.before_request
+def start_request_timing():
+    g.request_started = time.perf_counter()
+    g.spans = {}
+    g.profiler = None
+    if request.args.get('profile') == '1' and session.get('username') in PROFILE_ADMINS:
+        g.profiler = SamplingProfiler(threading.get_ident())
+
+# Registered before compress_response, so it runs after it and includes compression
+@app.after_request
+def record_request_timing(response):
+    if 'request_started' not in g:
+        return response
+    elapsed = time.perf_counter() - g.request_started
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    observe(request_histograms, (request.method, endpoint, str(response.status_code)), elapsed)
+    timings = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in g.spans.items()]
+    response.headers['Server-Timing'] = ', '.join(timings + [f"total;dur={elapsed * 1000:.1f}"])
+    if g.profiler is not None:
+        response.headers['X-Profile'] = g.profiler.stop(endpoint)
+        g.profiler = None
+    return response
+
+# Response encoding. numpy/pandas values, NaN and Timestamps are handled
+# inside the encoder (orjson when installed), so results are serialized as
+# built instead of being walked and converted first.
+RESPONSE_COMPRESSION = os.getenv("RESPONSE_COMPRESSION", "auto")  # auto | off
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", 2048))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 5))
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", 3))
+NDJSON_LINES_PER_CHUNK = 1000
+
+def json_default(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+        return None if isinstance(value, float) and value != value else value
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if value is pd.NaT:
+        return None
+    if isinstance(value, date):
+        return http_date(value)  # Same format Flask's encoder uses
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+if orjson is not None:
+    # NaN/inf become null; int row positions are valid keys; dates go through json_default
+    ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    class FastJSONProvider(DefaultJSONProvider):
+        def dumps(self, obj, **kwargs):
+            with span('serialize'):
+                return orjson.dumps(obj, default=json_default, option=ORJSON_OPTIONS).decode()
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+
+        def response(self, *args, **kwargs):
+            obj = self._prepare_response_obj(args, kwargs)
+            with span('serialize'):
+                body = orjson.dumps(obj, default=json_default, option=ORJSON_OPTIONS)
+            return self._app.response_class(body, mimetype=self.mimetype)
+else:
+    class FastJSONProvider(DefaultJSONProvider):
+        default = staticmethod(json_default)
+
+        def response(self, *args, **kwargs):
+            with span('serialize'):
+                return super().response(*args, **kwargs)
+
+app.json = FastJSONProvider(app)
+
+def ndjson_response(header, records):
+    # One header object, then one record per line, so clients can render as lines arrive
+    def lines():
+        yield app.json.dumps(header) + '\n'
+        for start in range(0, len(records), NDJSON_LINES_PER_CHUNK):
+            yield ''.join(app.json.dumps(record) + '\n' for record in records[start:start + NDJSON_LINES_PER_CHUNK])
+    return Response(lines(), mimetype='application/x-ndjson')
+
+@app.after_request
+def compress_response(response):
+    if RESPONSE_COMPRESSION == 'off' or response.direct_passthrough or response.is_streamed:
+        return response
+    if response.mimetype != 'application/json' or 'Content-Encoding' in response.headers:
+        return response
+    if (response.content_length or 0) < COMPRESS_MIN_BYTES:
+        return response
+    accepted = request.headers.get('Accept-Encoding', '').lower()
+    with span('compress'):
+        if zstandard is not None and 'zstd' in accepted:
+            body, encoding = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(response.get_data()), 'zstd'
+        elif 'gzip' in accepted:
+            body, encoding = gzip.compress(response.get_data(), compresslevel=GZIP_LEVEL), 'gzip'
+        else:
+            return response
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+
+class TimedCursorMixin:
+    """Times statements as db_query spans and row reads as db_fetch spans."""
+
+    def execute(self, query, args=None):
+        with span('db_query'):
+            return super().execute(query, args)
+
+    def fetchone(self):
+        with span('db_fetch'):
+            return super().fetchone()
+
+    def fetchmany(self, size=None):
+        with span('db_fetch'):
+            return super().fetchmany(size)
+
+    def fetchall(self):
+        with span('db_fetch'):
+            return super().fetchall()
+
 
+class TimedDictCursor(TimedCursorMixin, pymysql.cursors.DictCursor):
+    pass
+
+
+class TimedSSCursor(TimedCursorMixin, pymysql.cursors.SSCursor):
+    pass
 
 
 # Database Configuration from .env
@@ -31,39 +313,576 @@ DB_CONFIG = {
     "user": os.getenv("DB_USER"),
     "password": os.getenv("DB_PASSWORD"),
     "database": os.getenv("DB_NAME"),
-    "cursorclass": pymysql.cursors.DictCursor,
+    "cursorclass": TimedDictCursor,
     "autocommit": True
 }
 
 POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))  # Default to 10 if not set
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))  # Seconds to wait for a free connection
+POOL_PING_AFTER = float(os.getenv("DB_POOL_PING_AFTER", 60))  # Ping connections idle longer than this
+POOL_RECYCLE = float(os.getenv("DB_POOL_RECYCLE", 3600))  # Replace connections older than this
+
+
+class PoolTimeout(Exception):
+    pass
+
 
 # Database Connection Pool
 class DatabasePool:
-    def __init__(self, size=POOL_SIZE):
-        self.pool = []
-        self.size = size
-        self.create_pool()
+    """Bounded, thread-safe pool. Connections are opened on demand up to `size`,
+    checked for liveness when they have been idle for a while and replaced
+    once they are older than `recycle` seconds."""
 
-    def create_pool(self):
-        for _ in range(self.size):
-            conn = pymysql.connect(**DB_CONFIG)
-            self.pool.append(conn)
-
-    def get_conn(self):
-        if not self.pool:
-            self.create_pool()
-        return self.pool.pop(0)
+    def __init__(self, size=POOL_SIZE, timeout=POOL_TIMEOUT, ping_after=POOL_PING_AFTER, recycle=POOL_RECYCLE):
+        self.size = size
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self.recycle = recycle
+        self.idle = deque()  # (conn, created_at, released_at)
+        self.born = {}  # id(conn) -> created_at for checked-out connections
+        self.in_use = 0  # Checked-out connections plus slots reserved while connecting
+        self.lock = threading.Condition()
+        self.stats = {
+            'created': 0,
+            'destroyed': 0,
+            'checkouts': 0,
+            'timeouts': 0,
+            'waiting': 0,
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0
+        }
+
+    def _open(self):
+        conn = pymysql.connect(**DB_CONFIG)
+        with self.lock:
+            self.stats['created'] += 1
+        return conn
+
+    def _destroy(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self.lock:
+            self.stats['destroyed'] += 1
+
+    def _healthy(self, conn, created_at, released_at):
+        now = time.time()
+        if now - created_at > self.recycle:
+            return False
+        if now - released_at > self.ping_after:
+            try:
+                conn.ping(reconnect=False)
+            except Exception:
+                return False
+        return True
+
+    def get_conn(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        started = time.perf_counter()
+        deadline = started + timeout
+
+        with self.lock:
+            if not self.idle and self.in_use >= self.size:
+                self.stats['waiting'] += 1
+                try:
+                    while not self.idle and self.in_use >= self.size:
+                        remaining = deadline - time.perf_counter()
+                        if remaining <= 0:
+                            self.stats['timeouts'] += 1
+                            raise PoolTimeout(f"No database connection available after {timeout}s")
+                        self.lock.wait(remaining)
+                finally:
+                    self.stats['waiting'] -= 1
+            # Reserve the slot before doing any I/O outside the lock
+            self.in_use += 1
+            idle_entry = self.idle.popleft() if self.idle else None
+
+        conn = None
+        try:
+            if idle_entry:
+                conn, created_at, released_at = idle_entry
+                if not self._healthy(conn, created_at, released_at):
+                    self._destroy(conn)
+                    conn = None
+            if conn is None:
+                conn = self._open()
+                created_at = time.time()
+        except Exception:
+            with self.lock:
+                self.in_use -= 1
+                self.lock.notify()
+            raise
+
+        with self.lock:
+            self.born[id(conn)] = created_at
+            waited = time.perf_counter() - started
+            self.stats['checkouts'] += 1
+            self.stats['wait_seconds_total'] += waited
+            self.stats['wait_seconds_max'] = max(self.stats['wait_seconds_max'], waited)
+        return conn
+
+    def release(self, conn, broken=False):
+        with self.lock:
+            created_at = self.born.pop(id(conn), None)
+            if created_at is None:
+                return  # Not ours or already released
+            self.in_use -= 1
+            keep = not broken and conn.open
+            if keep:
+                self.idle.append((conn, created_at, time.time()))
+            self.lock.notify()
+        if not keep:
+            self._destroy(conn)
+
+    @contextmanager
+    def connection(self, timeout=None):
+        with span('db_checkout'):
+            conn = self.get_conn(timeout)
+        broken = False
+        try:
+            yield conn
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+            raise
+        finally:
+            self.release(conn, broken=broken)
+
+    def metrics(self):
+        with self.lock:
+            checkouts = self.stats['checkouts']
+            return {
+                **self.stats,
+                'size': self.size,
+                'in_use': self.in_use,
+                'idle': len(self.idle),
+                'wait_seconds_avg': self.stats['wait_seconds_total'] / checkouts if checkouts else 0.0
+            }
 
-    def release(self, conn):
-        self.pool.append(conn)
+    def after_fork(self):
+        # A forked worker must not share its parent's sockets. The inherited
+        # connections are dropped without close(), which would send COM_QUIT
+        # down the parent's connection; each worker opens its own on demand.
+        self.idle = deque()
+        self.born = {}
+        self.in_use = 0
+        self.lock = threading.Condition()
+        self.stats.update(created=0, destroyed=0, checkouts=0, timeouts=0, waiting=0, wait_seconds_total=0.0, wait_seconds_max=0.0)
 
 pool = DatabasePool()
+os.register_at_fork(after_in_child=lambda: pool.after_fork())
+
+print(f"Database pool for '{DB_CONFIG['database']}' at {DB_CONFIG['host']} (max {POOL_SIZE} connections)")
+
+STREAM_BATCH_ROWS = int(os.getenv("STREAM_BATCH_ROWS", 50000))
+
+def stream_table(table_name, batch_rows=STREAM_BATCH_ROWS, columns=None):
+    # Unbuffered cursor: rows come off the socket batch by batch instead of all at once
+    select = ', '.join(f"`{col}`" for col in columns) if columns else '*'
+    with pool.connection() as conn, conn.cursor(TimedSSCursor) as cursor:
+        cursor.execute(f"SELECT {select} FROM `{table_name}`;")
+        column_names = [desc[0] for desc in cursor.description]
+        while True:
+            batch = cursor.fetchmany(batch_rows)
+            if not batch:
+                break
+            with span('dataframe'):
+                frame = pd.DataFrame(list(batch), columns=column_names, dtype=object)
+            yield frame
+
+
+# Columnar snapshots. Each table is mirrored to an Arrow IPC file that the
+# analytics readers memory-map, decoding only the columns they ask for.
+# MySQL stays the source of truth: a snapshot is used only while the table
+# version stamped into it is current. It is written in the background after
+# an upload; after edits it is rewritten lazily, once a read finds it stale
+# and the table has gone SNAPSHOT_QUIET_SECONDS without an edit, so an
+# editing session doesn't keep re-streaming the whole table.
+SNAPSHOT_ENABLED = os.getenv("SNAPSHOT_ENABLED", "1") == "1" and pa is not None
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapshots"))
+SNAPSHOT_RETRY_SECONDS = float(os.getenv("SNAPSHOT_RETRY_SECONDS", 60))  # Wait after a failed write; doubles with each further failure
+SNAPSHOT_RETRY_MAX_SECONDS = float(os.getenv("SNAPSHOT_RETRY_MAX_SECONDS", 3600))
+SNAPSHOT_QUIET_SECONDS = float(os.getenv("SNAPSHOT_QUIET_SECONDS", 30))  # Edit-free time before a stale snapshot is rewritten
+
+snapshot_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="snapshot")
+snapshot_pending = set()
+snapshot_failures = {}  # table -> (version that failed, failures in a row, retry after)
+snapshot_versions = {}  # table -> (current version, when this process first saw it)
+snapshot_lock = threading.Lock()
+
+def snapshot_path(table_name):
+    return os.path.join(SNAPSHOT_DIR, hashlib.sha1(table_name.encode()).hexdigest() + '.arrow')
+
+def arrow_type(col_type):
+    col_type = col_type.lower()
+    base = col_type.split('(')[0].split()[0]
+    if base in ('tinyint', 'smallint', 'mediumint', 'int', 'integer', 'bigint', 'year'):
+        return pa.uint64() if base == 'bigint' and 'unsigned' in col_type else pa.int64()
+    if base in ('float', 'double', 'real'):
+        return pa.float64()
+    if base in ('decimal', 'numeric'):
+        args = col_type[col_type.find('(') + 1:col_type.find(')')].split(',') if '(' in col_type else ['10', '0']
+        return pa.decimal128(int(args[0]), int(args[1]) if len(args) > 1 else 0)
+    if base == 'date':
+        return pa.date32()
+    if base in ('datetime', 'timestamp'):
+        return pa.timestamp('us')
+    if base in ('binary', 'varbinary', 'tinyblob', 'blob', 'mediumblob', 'longblob'):
+        return pa.binary()
+    return pa.string()
+
+def write_snapshot(table_name):
+    version = table_version(table_name)  # Read first: a write racing this pass leaves the snapshot stale, never wrong
+    with pool.connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"DESCRIBE `{table_name}`;")
+        described = cursor.fetchall()
+    schema = pa.schema([(row['Field'], arrow_type(row['Type'])) for row in described], metadata={'version': version})
 
-print(f"Connected to database '{DB_CONFIG['database']}' at {DB_CONFIG['host']}")
-
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=SNAPSHOT_DIR, suffix='.tmp')
+    os.close(fd)
+    try:
+        # Uncompressed IPC, one record batch per streamed chunk, so readers can map it without decoding
+        with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, schema) as writer:
+            for chunk in stream_table(table_name):
+                writer.write_batch(pa.RecordBatch.from_pandas(chunk, schema=schema, preserve_index=False))
+        os.replace(tmp_path, snapshot_path(table_name))
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+def refresh_snapshot(table_name):
+    with snapshot_lock:
+        snapshot_pending.discard(table_name)  # Changes from here on queue another pass
+    version = table_version(table_name)
+    try:
+        write_snapshot(table_name)
+    except Exception:
+        print(traceback.format_exc())
+        with snapshot_lock:
+            _, failures, _ = snapshot_failures.get(table_name, (None, 0, 0))
+            wait = min(SNAPSHOT_RETRY_SECONDS * 2 ** failures, SNAPSHOT_RETRY_MAX_SECONDS)
+            snapshot_failures[table_name] = (version, failures + 1, time.time() + wait)
+        return
+    with snapshot_lock:
+        snapshot_failures.pop(table_name, None)
+
+def note_table_edit(table_name, version):
+    # Edits don't rewrite the snapshot; they restart the quiet period a stale read waits out
+    with snapshot_lock:
+        snapshot_versions[table_name] = (version, time.time())
+
+def schedule_snapshot(table_name, when_quiet=False):
+    # when_quiet: only once the current version is SNAPSHOT_QUIET_SECONDS old.
+    # A version first seen here (edited by another worker) starts the clock now
+    if not SNAPSHOT_ENABLED or analysis_worker:  # The parent of an analysis process schedules its own
+        return
+    version = table_version(table_name)
+    with snapshot_lock:
+        if table_name in snapshot_pending:
+            return
+        if when_quiet:
+            seen_version, seen_at = snapshot_versions.get(table_name, (None, 0))
+            if seen_version != version:
+                snapshot_versions[table_name] = (version, time.time())
+                return
+            if time.time() - seen_at < SNAPSHOT_QUIET_SECONDS:
+                return
+        # A version whose write failed is retried only after a back-off; a new version is tried at once
+        failed = snapshot_failures.get(table_name)
+        if failed and failed[0] == version and time.time() < failed[2]:
+            return
+        snapshot_pending.add(table_name)
+    snapshot_executor.submit(refresh_snapshot, table_name)
+
+def drop_snapshot(table_name):
+    with snapshot_lock:
+        snapshot_failures.pop(table_name, None)
+        snapshot_versions.pop(table_name, None)
+    try:
+        os.remove(snapshot_path(table_name))
+    except OSError:
+        pass
+
+def snapshot_batches(table_name, columns=None):
+    # Frames shaped like stream_table's (object dtype, None for NULL), or None
+    # when there is no current snapshot
+    if not SNAPSHOT_ENABLED:
+        return None
+    try:
+        reader = pa.ipc.open_file(pa.memory_map(snapshot_path(table_name)))
+    except (OSError, pa.ArrowInvalid):
+        return None
+    if (reader.schema.metadata or {}).get(b'version', b'').decode() != table_version(table_name):
+        return None
+
+    def batches():
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)  # Zero-copy view into the mapped file
+            if columns is not None:
+                batch = batch.select(columns)
+            with span('dataframe'):
+                frame = batch.to_pandas(integer_object_nulls=True, date_as_object=True, timestamp_as_object=True)
+                frame = frame.astype(object).where(frame.notna(), None)
+            yield frame
+
+    return batches()
+
+def table_batches(table_name, columns=None, batch_rows=STREAM_BATCH_ROWS):
+    # Analytics reads: the snapshot when it is current, otherwise MySQL (and,
+    # once edits have paused, queue a snapshot so later reads can use it).
+    # Snapshot batches keep the size they were written with.
+    batches = snapshot_batches(table_name, columns)
+    if batches is None:
+        schedule_snapshot(table_name, when_quiet=True)
+        batches = stream_table(table_name, batch_rows, columns)
+    return batches
+
+
+# Analysis result cache. Results are keyed by table name plus a version token
+# that /upload, /update_record and /delete_table replace whenever the data changes.
+ANALYSIS_CACHE_BACKEND = os.getenv("ANALYSIS_CACHE_BACKEND", "memory")  # memory | disk
+ANALYSIS_CACHE_MAX_MB = float(os.getenv("ANALYSIS_CACHE_MAX_MB", 256))
+ANALYSIS_CACHE_DIR = os.getenv("ANALYSIS_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "analysis_cache"))
+
+
+class MemoryCache:
+    """In-process LRU bounded by the pickled size of its entries."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, key, track=True):
+        with self.lock:
+            blob = self.entries.get(key)
+            if track:
+                self.stats['hits' if blob is not None else 'misses'] += 1
+            if blob is None:
+                return None
+            self.entries.move_to_end(key)
+        return pickle.loads(blob)
+
+    def set(self, key, value):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self.entries[key] = blob
+            self.size += len(blob)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.stats['evictions'] += 1
+
+    def metrics(self):
+        with self.lock:
+            return {**self.stats, 'backend': 'memory', 'entries': len(self.entries), 'bytes': self.size, 'max_bytes': self.max_bytes}
+
+
+class DiskCache:
+    """Pickle files in a directory, so cached results survive restarts and are
+    shared by every worker process. Recency is tracked with file mtimes, and
+    the size bound is checked against the directory itself, since other
+    processes write to it too."""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        os.makedirs(directory, exist_ok=True)
+
+    def _entries(self):
+        # (mtime, size, path) of every entry, oldest first
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pkl'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue  # Evicted by another process mid-scan
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return sorted(entries)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + '.pkl')
+
+    def get(self, key, track=True):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as handle:
+                value = pickle.load(handle)
+            os.utime(path)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            value = None
+        if track:
+            with self.lock:
+                self.stats['hits' if value is not None else 'misses'] += 1
+        return value
+
+    def set(self, key, value):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_bytes:
+            return
+        path = self._path(key)
+        # Write to a temp file and rename so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as handle:
+            handle.write(blob)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        entries = self._entries()
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, entry_path in entries:
+            if size <= self.max_bytes:
+                break
+            try:
+                os.remove(entry_path)
+            except OSError:
+                continue  # Already gone
+            size -= entry_size
+            with self.lock:
+                self.stats['evictions'] += 1
+
+    def metrics(self):
+        size = sum(entry_size for _, entry_size, _ in self._entries())
+        with self.lock:
+            return {**self.stats, 'backend': 'disk', 'directory': self.directory, 'bytes': size, 'max_bytes': self.max_bytes}
+
+
+CACHE_BACKENDS = {
+    'memory': lambda: MemoryCache(int(ANALYSIS_CACHE_MAX_MB * 2 ** 20)),
+    'disk': lambda: DiskCache(ANALYSIS_CACHE_DIR, int(ANALYSIS_CACHE_MAX_MB * 2 ** 20))
+}
+analysis_cache = CACHE_BACKENDS[ANALYSIS_CACHE_BACKEND]()
+
+# Inside an analysis process (see run_analysis) the parent pins the version a
+# job reads: the process has a cache of its own and never sees bumps.
+analysis_worker = False
+worker_versions = {}
+
+def table_version(table_name):
+    if analysis_worker:
+        return worker_versions[table_name]
+    # Versions live in the cache itself. A random token (not a counter) means a
+    # lost or evicted version can never make an old entry look current again.
+    version = analysis_cache.get(f"version:{table_name}", track=False)
+    if version is None:
+        version = bump_table_version(table_name)
+    return version
+
+def bump_table_version(table_name):
+    version = uuid.uuid4().hex
+    analysis_cache.set(f"version:{table_name}", version)
+    return version
+
+def result_key(kind, table_name, version, *params):
+    return ':'.join(str(part) for part in (kind, table_name, version, *params))
+
+def cached_result(kind, table_name, compute, *params):
+    key = result_key(kind, table_name, table_version(table_name), *params)
+    result = analysis_cache.get(key)
+    if result is None:
+        result = compute()
+        analysis_cache.set(key, result)
+    return result
+
+
+# Session store. memory keeps sessions in this process (single worker);
+# redis uses any Redis-protocol server at SESSION_REDIS_URL, shared by every
+# worker and host; filesystem is the old file-per-session store.
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")  # memory | redis | filesystem
+SESSION_LIFETIME = int(os.getenv("SESSION_LIFETIME", 86400))  # Seconds a session lives without being refreshed
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", 10000))
+SESSION_REDIS_URL = os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0")
+
+
+class MemorySessionStore(BaseCache):
+    """cachelib backend: an LRU of at most max_entries sessions, each dropped
+    once its timeout has passed."""
+
+    def __init__(self, max_entries, default_timeout):
+        super().__init__(default_timeout)
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (expires_at, value), least recently used first
+        self.lock = threading.Lock()
+
+    def _expires_at(self, timeout):
+        timeout = self._normalize_timeout(timeout)
+        return time.time() + timeout if timeout else float('inf')
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, timeout=None):
+        with self.lock:
+            self.entries[key] = (self._expires_at(timeout), value)
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.max_entries:
+                now = time.time()
+                for expired in [k for k, (expires_at, _) in self.entries.items() if expires_at <= now]:
+                    del self.entries[expired]
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        return True
+
+    def add(self, key, value, timeout=None):
+        with self.lock:
+            if key in self.entries and self.entries[key][0] > time.time():
+                return False
+        return self.set(key, value, timeout)
+
+    def delete(self, key):
+        with self.lock:
+            return self.entries.pop(key, None) is not None
+
+    def has(self, key):
+        return self.get(key) is not None
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+        return True
+
+
+def redis_session_config():
+    if redis is None:
+        raise RuntimeError("SESSION_BACKEND=redis needs the redis package")
+    return {'SESSION_TYPE': 'redis', 'SESSION_REDIS': redis.Redis.from_url(SESSION_REDIS_URL)}
+
+SESSION_BACKENDS = {
+    'memory': lambda: {'SESSION_TYPE': 'cachelib', 'SESSION_CACHELIB': MemorySessionStore(SESSION_MAX_ENTRIES, SESSION_LIFETIME)},
+    'redis': redis_session_config,
+    'filesystem': lambda: {
+        'SESSION_TYPE': 'filesystem',
+        'SESSION_FILE_DIR': os.getenv('SESSION_FILE_DIR', os.path.join(os.getcwd(), 'flask_session'))
+    }
+}
 
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'supersecretkey')
-app.config['SESSION_TYPE'] = 'filesystem'
+app.config.update(SESSION_BACKENDS[SESSION_BACKEND]())
+app.config['PERMANENT_SESSION_LIFETIME'] = SESSION_LIFETIME  # Also the store's TTL
+app.config['SESSION_REFRESH_EACH_REQUEST'] = False  # Write the store only when the session changed
 app.config['SESSION_PERMANENT'] = False
 app.config['SESSION_USE_SIGNER'] = True
 app.config['SESSION_COOKIE_HTTPONLY'] = True
@@ -80,11 +899,9 @@ def register():
         return jsonify({"error": "Username and password are required"}), 400
 
     try:
-        conn = pool.get_conn()
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO users (username, password) VALUES (%s, %s)", (username, password))
-        conn.commit()
-        pool.release(conn)
+        with pool.connection() as conn, conn.cursor() as cursor:
+            cursor.execute("INSERT INTO users (username, password) VALUES (%s, %s)", (username, password))
+            conn.commit()
         return jsonify({"message": "User registered successfully"}), 201
     except pymysql.err.IntegrityError:
         return jsonify({"error": "Username already exists"}), 409
@@ -92,164 +909,1579 @@ def register():
         return jsonify({"error": str(e)}), 500
 
 # Cramér's V for categorical data
+CRAMERS_MAX_CARDINALITY = int(os.getenv("CRAMERS_MAX_CARDINALITY", 100))  # Wider columns make V meaningless
+CRAMERS_WORKERS = int(os.getenv("CRAMERS_WORKERS", os.cpu_count() or 1))
+# rows x pairs from which the process pool pays off. Unset, it is measured
+# when the pool is warmed (see warm_pair_processes); until then pairs are
+# scored serially, so no request waits for the pool to spawn
+CRAMERS_PARALLEL_MIN_CELLS = int(os.getenv("CRAMERS_PARALLEL_MIN_CELLS")) if os.getenv("CRAMERS_PARALLEL_MIN_CELLS") else None
+
 def cramers_v(x, y):
-    contingency_table = pd.crosstab(x, y)
+    return cramers_v_from_table(pd.crosstab(x, y))
+
+def cramers_v_from_table(contingency_table):
+    contingency_table = np.asarray(contingency_table)
+    r, k = contingency_table.shape
+    if min(r, k) < 2:
+        return np.nan
+    from scipy import stats  # Deferred: scipy is slow to import and only analysis needs it
     chi2, p, dof, expected = stats.chi2_contingency(contingency_table)
-    n = contingency_table.sum().sum()
+    n = contingency_table.sum()
     phi2 = chi2 / n
-    r, k = contingency_table.shape
     return (phi2 / min(k - 1, r - 1)) ** 0.5
 
+def factorize_columns(df, columns, max_cardinality=CRAMERS_MAX_CARDINALITY):
+    # Each column is turned into integer codes once; -1 marks missing values
+    codes, skipped = {}, {}
+    for col in columns:
+        col_codes, uniques = pd.factorize(df[col])
+        if len(uniques) > max_cardinality:
+            skipped[col] = f"{len(uniques)} distinct values (limit {max_cardinality})"
+        elif len(uniques) < 2:
+            skipped[col] = "fewer than 2 distinct values"
+        else:
+            codes[col] = (col_codes.astype(np.int32), len(uniques))
+    return codes, skipped
+
+def contingency_from_codes(a, ka, b, kb):
+    valid = (a >= 0) & (b >= 0)
+    table = np.bincount(a[valid].astype(np.int64) * kb + b[valid], minlength=ka * kb).reshape(ka, kb)
+    # Same shape pd.crosstab would give: only categories seen alongside a non-missing partner
+    return table[table.sum(axis=1) > 0][:, table.sum(axis=0) > 0]
+
+def score_pairs(pairs, codes):
+    return [(col1, col2, cramers_v_from_table(contingency_from_codes(*codes[col1], *codes[col2]))) for col1, col2 in pairs]
+
+# One spawned pool shared by every request. The codes of a request are put in
+# shared memory once; tasks carry only its name, the pairs and a wall-clock
+# deadline, after which workers stop scoring instead of running on unobserved.
+pair_pool = None
+pair_pool_lock = threading.Lock()
+pair_min_cells = CRAMERS_PARALLEL_MIN_CELLS  # None: serial only
+
+def pair_processes():
+    global pair_pool
+    with pair_pool_lock:
+        if pair_pool is None:
+            pair_pool = ProcessPoolExecutor(max_workers=CRAMERS_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return pair_pool
+
+def reset_pair_processes():
+    global pair_pool, pair_min_cells
+    pair_pool = None  # Belongs to the parent; a forked worker starts its own
+    pair_min_cells = CRAMERS_PARALLEL_MIN_CELLS
+
+os.register_at_fork(after_in_child=reset_pair_processes)
+
+def score_pairs_in_worker(memory_name, shape, layout, pairs, deadline):
+    if deadline and time.time() > deadline:
+        return []
+    memory = shared_memory.SharedMemory(name=memory_name)
+    try:
+        matrix = np.ndarray(shape, dtype=np.int32, buffer=memory.buf)
+        codes = {col: (matrix[row], k) for col, (row, k) in layout.items()}
+        results = []
+        for pair in pairs:
+            if deadline and time.time() > deadline:
+                break
+            results += score_pairs([pair], codes)
+        del matrix, codes  # Views must go before the mapping is closed
+        return results
+    finally:
+        memory.close()
+
+def cramers_v_matrix(codes, time_budget=None, workers=CRAMERS_WORKERS, min_cells=None):
+    columns = list(codes)
+    pairs = list(combinations(columns, 2))
+    deadline = time.perf_counter() + time_budget if time_budget else None
+    rows = len(next(iter(codes.values()))[0]) if codes else 0
+    min_cells = pair_min_cells if min_cells is None else min_cells
+    scores = {}
+
+    if workers > 1 and min_cells is not None and rows * len(pairs) >= min_cells:
+        batches = [batch for batch in (pairs[i::workers * 4] for i in range(workers * 4)) if batch]
+        shape = (len(columns), rows)
+        memory = shared_memory.SharedMemory(create=True, size=max(1, shape[0] * shape[1] * 4))
+        try:
+            matrix = np.ndarray(shape, dtype=np.int32, buffer=memory.buf)
+            for row, col in enumerate(columns):
+                matrix[row] = codes[col][0]
+            del matrix
+            layout = {col: (row, codes[col][1]) for row, col in enumerate(columns)}
+            wall_deadline = time.time() + time_budget if time_budget else None
+            try:
+                futures = [pair_processes().submit(score_pairs_in_worker, memory.name, shape, layout, batch, wall_deadline) for batch in batches]
+            except BrokenProcessPool:
+                reset_pair_processes()  # A worker died; the next matrix gets a fresh pool
+                raise
+            done, not_done = wait(futures, timeout=max(0, deadline - time.perf_counter()) if deadline else None)
+            for future in not_done:
+                future.cancel()  # Queued batches never start; running ones stop at the deadline
+            for future in done:
+                scores.update({(col1, col2): score for col1, col2, score in future.result()})
+        finally:
+            memory.close()
+            memory.unlink()
+    else:
+        for pair in pairs:
+            if deadline and time.perf_counter() > deadline:
+                break
+            scores.update({(col1, col2): score for col1, col2, score in score_pairs([pair], codes)})
+
+    return scores, len(scores) < len(pairs)
+
+def warm_pair_processes():
+    # Spawns the pool (and imports this module in each worker) in the
+    # background, then times the same matrix serially and on the warm pool
+    # to find the size from which the pool wins
+    if CRAMERS_WORKERS > 1:
+        threading.Thread(target=calibrate_pair_processes, name='cramers-warmup', daemon=True).start()
+
+def calibrate_pair_processes(rows=200000):
+    global pair_min_cells
+    try:
+        width = 2
+        while width * (width - 1) // 2 < CRAMERS_WORKERS:  # At least one batch per worker, so all of them spawn
+            width += 1
+        rng = np.random.default_rng(0)
+        codes = {f'c{i}': (rng.integers(0, 20, 4 * rows).astype(np.int32), 20) for i in range(width)}
+        pairs = width * (width - 1) // 2
+
+        def best_of(size, **kwargs):
+            sized = {col: (values[:size], k) for col, (values, k) in codes.items()}
+            timings = []
+            for _ in range(3):
+                started = time.perf_counter()
+                cramers_v_matrix(sized, **kwargs)
+                timings.append(time.perf_counter() - started)
+            return min(timings)
+
+        cramers_v_matrix(codes, min_cells=0)  # Spawn the workers and import everything on both sides
+        score_pairs([('c0', 'c1')], codes)
+
+        # Serial and pool time as lines over cells, from two sizes; the pool
+        # pays off past the point where they cross (never, if it isn't faster per cell)
+        small, large = rows * pairs, 4 * rows * pairs
+        serial = [best_of(rows, workers=1), best_of(4 * rows, workers=1)]
+        parallel = [best_of(rows, min_cells=0), best_of(4 * rows, min_cells=0)]
+        serial_cost, parallel_cost = ((times[1] - times[0]) / (large - small) for times in (serial, parallel))
+        if serial_cost > parallel_cost:
+            overhead = (parallel[0] - parallel_cost * small) - (serial[0] - serial_cost * small)
+            measured = max(0, int(overhead / (serial_cost - parallel_cost)))
+        else:
+            measured = None
+        if CRAMERS_PARALLEL_MIN_CELLS is None:
+            pair_min_cells = measured
+        print(f"Cramér's V pool warm: {large} cells in {serial[1]:.3f}s serial, {parallel[1]:.3f}s on "
+              f"{CRAMERS_WORKERS} processes; pool from {pair_min_cells if pair_min_cells is not None else 'never'} cells")
+    except Exception:
+        print(traceback.format_exc())
+
+def categorical_correlations(codes, skipped, time_budget=None):
+    scores, incomplete = cramers_v_matrix(codes, time_budget)
+    return categorical_entries(list(codes), scores, skipped, incomplete)
+
+def categorical_entries(columns, scores, skipped, incomplete):
+    def native(score):
+        return float(score) if score is not None and not np.isnan(score) else None
+
+    matrix = {col: {other: (1.0 if col == other else None) for other in columns} for col in columns}
+    entries = []
+    for (col1, col2), score in scores.items():
+        matrix[col1][col2] = matrix[col2][col1] = native(score)
+    for col1, col2 in combinations(columns, 2):
+        if (col1, col2) in scores:
+            entries.append(categorical_correlation(col1, col2, scores[(col1, col2)]))
+    entries.append({
+        'correlation_type': 'Categorical matrix',
+        'correlation_matrix': matrix,
+        'skipped_columns': skipped,
+        'incomplete': incomplete  # True when the time budget ran out
+    })
+    return entries
+
+
+class IncrementalCodes:
+    """Factorizes a column chunk by chunk against one growing dictionary and
+    gives up (dropping its codes) once the column exceeds max_cardinality."""
+
+    def __init__(self, max_cardinality=CRAMERS_MAX_CARDINALITY):
+        self.max_cardinality = max_cardinality
+        self.index = {}
+        self.parts = []
+        self.overflow = False
+
+    def update(self, values):
+        if self.overflow:
+            return
+        local_codes, uniques = pd.factorize(values)
+        mapping = np.array([self.index.setdefault(value, len(self.index)) for value in uniques], dtype=np.int32)
+        if len(self.index) > self.max_cardinality:
+            self.overflow, self.parts = True, []
+            return
+        if len(mapping):
+            self.parts.append(np.where(local_codes >= 0, mapping[np.maximum(local_codes, 0)], -1).astype(np.int32))
+        else:
+            self.parts.append(np.full(len(values), -1, dtype=np.int32))
+
+    def result(self):
+        if self.overflow:
+            return None, f"more than {self.max_cardinality} distinct values"
+        if len(self.index) < 2:
+            return None, "fewer than 2 distinct values"
+        return (np.concatenate(self.parts), len(self.index)), None
+
+def to_native(value):
+    # numpy scalars -> plain Python so jsonify can handle them
+    return value.item() if isinstance(value, np.generic) else value
+
+def row_ids(frame):
+    # As floats, so a missing or non-numeric id shows up as NaN
+    return pd.to_numeric(frame['id'], errors='coerce').to_numpy(dtype=np.float64) if 'id' in frame.columns else None
+
+def listed_ids(ids, mask):
+    # ids of the rows mask flags; rows without an id still count but can't be listed
+    if ids is None:
+        return np.empty(0, dtype=np.int64)
+    ids = ids[np.asarray(mask)]
+    return ids[~np.isnan(ids)].astype(np.int64)
+
+def coerce_types(df):
+    # Convert columns to appropriate types
+    df = df.apply(pd.to_numeric, errors='ignore')
+    df = df.replace({None: np.nan, 'NULL': np.nan, '': np.nan})  # Standardize missing values
+    return df.infer_objects()  # Streamed chunks arrive as object columns
+
+def typed_frame(df, kinds=None):
+    # Declared kinds (see declared_kinds) when the table has them; otherwise guess from the values
+    return apply_kinds(df, kinds, missing_mask(df)) if kinds else coerce_types(df)
+
+# Independent analysis stages run concurrently on a shared, read-only DataFrame.
+# pandas/numpy/sklearn release the GIL for most of their heavy lifting, so threads suffice.
+ANALYZE_STAGE_WORKERS = int(os.getenv("ANALYZE_STAGE_WORKERS", os.cpu_count() or 1))
+ISOLATION_FOREST_JOBS = int(os.getenv("ISOLATION_FOREST_JOBS", -1))
+stage_executor = ThreadPoolExecutor(max_workers=ANALYZE_STAGE_WORKERS, thread_name_prefix="analysis")
+
+def run_stages(stages, record=True):
+    """stages: {name: (fn, [dependency names])}; fn receives the dependency
+    results as keyword arguments. Returns (results, seconds per stage).
+    record=False leaves the metrics to the caller, e.g. to sum them over chunks."""
+    results, timings, running = {}, {}, {}
+
+    def timed(name, fn, kwargs):
+        started = time.perf_counter()
+        value = fn(**kwargs)
+        return value, time.perf_counter() - started
+
+    def submit_ready():
+        for name, (fn, deps) in stages.items():
+            if name not in results and name not in running and all(dep in results for dep in deps):
+                running[name] = stage_executor.submit(timed, name, fn, {dep: results[dep] for dep in deps})
+
+    submit_ready()
+    while running:
+        done, _ = wait(running.values(), return_when=FIRST_COMPLETED)
+        for name in [name for name, future in running.items() if future in done]:
+            results[name], timings[name] = running.pop(name).result()
+        submit_ready()
+    if record:
+        record_timings('analysis', timings)
+    return results, {name: round(seconds, 4) for name, seconds in timings.items()}
+
+# Persisted anomaly models. Each table keeps one seeded IsolationForest on disk
+# (joblib, loaded memory-mapped) plus the statistics of the data it was fitted
+# on; it is refitted only when the row count or a numeric mean has moved.
+ANOMALY_MODEL_DIR = os.getenv("ANOMALY_MODEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "anomaly_models"))
+ANOMALY_SEED = int(os.getenv("ANOMALY_SEED", 0))
+ANOMALY_RETRAIN_ROWS = float(os.getenv("ANOMALY_RETRAIN_ROWS", 0.1))  # Row-count change, as a fraction, that forces a refit
+ANOMALY_RETRAIN_SHIFT = float(os.getenv("ANOMALY_RETRAIN_SHIFT", 0.25))  # Mean shift, in fitted standard deviations, that forces a refit
+ANOMALY_LOADED_MODELS = int(os.getenv("ANOMALY_LOADED_MODELS", 8))
+SCORE_BATCH_ROWS = int(os.getenv("SCORE_BATCH_ROWS", 10000))
+
+def new_isolation_forest():
+    from sklearn.ensemble import IsolationForest  # Deferred like scipy, to keep startup fast
+    return IsolationForest(contamination=0.05, random_state=ANOMALY_SEED, n_jobs=ISOLATION_FOREST_JOBS)
+
+loaded_models = OrderedDict()
+loaded_models_lock = threading.Lock()
+
+def model_meta_path(table_name):
+    # Table names can hold anything, file names can't
+    return os.path.join(ANOMALY_MODEL_DIR, hashlib.sha1(table_name.encode()).hexdigest() + '.json')
+
+def load_model_meta(table_name):
+    try:
+        with open(model_meta_path(table_name)) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+def load_model(meta):
+    path = os.path.join(ANOMALY_MODEL_DIR, meta['model_file'])
+    with loaded_models_lock:
+        if path in loaded_models:
+            loaded_models.move_to_end(path)
+            return loaded_models[path]
+    import joblib
+    model = joblib.load(path, mmap_mode='r')
+    with loaded_models_lock:
+        loaded_models[path] = model
+        while len(loaded_models) > ANOMALY_LOADED_MODELS:
+            loaded_models.popitem(last=False)
+    return model
+
+def save_model(table_name, model, frame, total_rows):
+    os.makedirs(ANOMALY_MODEL_DIR, exist_ok=True)
+    version = table_version(table_name)
+    meta_path = model_meta_path(table_name)
+    model_file = f"{os.path.basename(meta_path)[:-5]}-{version}.joblib"
+    previous = load_model_meta(table_name)
+    meta = {
+        'table_name': table_name,
+        'version': version,
+        'model_file': model_file,
+        'columns': list(frame.columns),
+        'rows': int(total_rows),
+        'fitted_rows': len(frame),
+        'mean': frame.mean().tolist(),
+        'std': frame.std(ddof=0).tolist(),
+        'seed': ANOMALY_SEED,
+        'trained_at': time.time()
+    }
+    # Temp file plus rename, so a concurrent reader sees the old model or the new one
+    fd, tmp_path = tempfile.mkstemp(dir=ANOMALY_MODEL_DIR, suffix='.tmp')
+    os.close(fd)
+    import joblib
+    joblib.dump(model, tmp_path)
+    os.replace(tmp_path, os.path.join(ANOMALY_MODEL_DIR, model_file))
+    fd, tmp_path = tempfile.mkstemp(dir=ANOMALY_MODEL_DIR, suffix='.tmp')
+    with os.fdopen(fd, 'w') as handle:
+        json.dump(meta, handle)
+    os.replace(tmp_path, meta_path)
+    if previous and previous['model_file'] != model_file:
+        drop_model_file(previous['model_file'])
+    return meta
+
+def drop_model_file(model_file):
+    path = os.path.join(ANOMALY_MODEL_DIR, model_file)
+    with loaded_models_lock:
+        loaded_models.pop(path, None)
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def drop_anomaly_model(table_name):
+    meta = load_model_meta(table_name)
+    if meta:
+        drop_model_file(meta['model_file'])
+        try:
+            os.remove(model_meta_path(table_name))
+        except OSError:
+            pass
+
+def needs_refit(meta, frame, total_rows):
+    if meta is None or meta['columns'] != list(frame.columns) or meta.get('seed') != ANOMALY_SEED:
+        return True
+    if abs(total_rows - meta['rows']) > ANOMALY_RETRAIN_ROWS * max(meta['rows'], 1):
+        return True
+    std = np.asarray(meta['std'], dtype=np.float64)
+    shift = np.abs(frame.mean().to_numpy(dtype=np.float64) - np.asarray(meta['mean'], dtype=np.float64)) / np.where(std > 0, std, 1)
+    return bool((shift > ANOMALY_RETRAIN_SHIFT).any())
+
+def anomaly_model(table_name, frame, total_rows):
+    # frame: the numeric fitting sample with NaNs already filled
+    meta = load_model_meta(table_name)
+    if not needs_refit(meta, frame, total_rows):
+        try:
+            return load_model(meta), {**meta, 'refitted': False}
+        except (OSError, ValueError, EOFError):
+            pass  # Missing or unreadable file: fall through and refit
+    model = new_isolation_forest().fit(frame)
+    return model, {**save_model(table_name, model, frame, total_rows), 'refitted': True}
+
+def model_columns(numeric_cols):
+    # The surrogate key only orders rows; fitting on it would also make every
+    # row scored later (e.g. by /score_rows) need one
+    return [col for col in numeric_cols if col != 'id']
+
+def model_info(meta):
+    return {key: meta[key] for key in ('version', 'columns', 'rows', 'fitted_rows', 'seed', 'trained_at', 'refitted') if key in meta}
+
+def build_analysis(df, time_budget=None, score_outliers=None, kinds=None):
+    # score_outliers(features) -> {label: (ids, count)} replaces fitting on df itself
+    started = time.perf_counter()
+    df = typed_frame(df, kinds)
+    ids = row_ids(df)
+    numeric_cols = df.select_dtypes(include=['number']).columns.tolist()
+    date_cols = df.select_dtypes(include=['datetime']).columns.tolist()
+    categorical_cols = df.select_dtypes(include=['object']).columns.tolist()
+
+    # Anomalies are kept as (ids, count) per reason; paged_report reads the rows it lists
+    def flagged(mask):
+        return listed_ids(ids, mask), int(mask.sum())
+
+    # **Missing Data Detection**
+    def missing():
+        missing_mask = df.isnull()
+        missing_data = {col: int(count) for col, count in missing_mask.sum().items()}
+        return missing_data, flagged(missing_mask.any(axis=1))
+
+    # **Duplicate Detection**
+    def duplicates():
+        duplicate_mask = df.duplicated(keep=False)
+        return int(duplicate_mask.sum()), flagged(duplicate_mask)
+
+    # **Most Common Values & Patterns**
+    def modes():
+        common_patterns = {}
+        for col in df.columns:
+            mode = df[col].mode()
+            common_patterns[col] = to_native(mode.iloc[0]) if not mode.empty else None
+        return common_patterns
+
+    # Numeric NaNs count as 0 for outliers and correlations; df itself stays untouched
+    def numeric_filled():
+        return df[numeric_cols].fillna(0) if not df.empty else df[numeric_cols]
+
+    # **Anomaly Detection (Numeric & Date)**
+    def outliers(numeric_filled):
+        features = model_columns(numeric_cols)
+        if df.empty or not features:
+            return {}
+        if score_outliers is not None:
+            return score_outliers(numeric_filled[features])
+        iso_forest = new_isolation_forest()
+        return {OUTLIER_LABEL: flagged(iso_forest.fit_predict(numeric_filled[features]) == -1)}
+
+    def dates():
+        listings = {}
+        for col in date_cols:
+            years = df[col].dt.year
+            listings[date_label(col)] = flagged((years < 1900) | (years > 2100))
+        return listings
+
+    # **Correlation Analysis**
+    def pearson(numeric_filled):
+        return [numerical_correlation(numeric_filled.corr(method='pearson'))] if numeric_cols else []
+
+    def cramers():
+        if not categorical_cols:
+            return []
+        codes, skipped = factorize_columns(df, categorical_cols)
+        return categorical_correlations(codes, skipped, time_budget)
+
+    results, timings = run_stages({
+        'missing': (missing, []),
+        'duplicates': (duplicates, []),
+        'modes': (modes, []),
+        'numeric_filled': (numeric_filled, []),
+        'outliers': (outliers, ['numeric_filled']),
+        'dates': (dates, []),
+        'pearson': (pearson, ['numeric_filled']),
+        'cramers': (cramers, [])
+    })
+
+    missing_data, missing_rows = results['missing']
+    duplicate_count, duplicate_rows = results['duplicates']
+    anomalies = {**results['outliers'], **results['dates'], DUPLICATE_LABEL: duplicate_rows, MISSING_LABEL: missing_rows}
+    correlations = results['pearson'] + results['cramers']
+
+    report = assemble_report(df.columns, missing_data, duplicate_count, results['modes'], anomalies, correlations)
+    report['stage_timings'] = {**timings, 'total': round(time.perf_counter() - started, 4)}
+    return report
+
+def numerical_correlation(numerical_corr):
+    return {
+        'correlation_type': 'Numerical',
+        'correlation_matrix': numerical_corr.astype(object).where(pd.notna(numerical_corr), None).to_dict()  # Replacing NaN with None
+    }
+
+def categorical_correlation(col1, col2, cramer_v_score):
+    return {
+        'correlation_type': 'Categorical',
+        'columns': (col1, col2),
+        'correlation_score': float(cramer_v_score) if not np.isnan(cramer_v_score) else None  # Replace NaN with None
+    }
+
+def assemble_report(columns, missing_data, duplicate_count, common_patterns, anomalies, correlations):
+    insights = []
+
+    # **General Insights**
+    for col in columns:
+        insights.append({
+            'column': col,
+            'missing_values': missing_data.get(col, 0),
+            'duplicates': duplicate_count,
+            'insight_type': 'General',
+            'most_common': common_patterns.get(col, None),
+            'details': f"{missing_data.get(col, 0)} missing values, {duplicate_count} duplicates.",
+            'suggested_action': (
+                'Fill missing values' if missing_data.get(col, 0) > 0 and duplicate_count == 0 
+                else 'Remove duplicates' if duplicate_count > 0 and missing_data.get(col, 0) == 0 
+                else 'Fill missing values, remove duplicates, and check anomalies.' if missing_data.get(col, 0) > 0 and duplicate_count > 0 
+                else 'No suggestions'
+            )
+        })
+
+    missing_data_formatted = [
+        {'column': col, 'missing_count': missing_data[col]}
+        for col in columns if missing_data.get(col, 0) > 0
+    ]
+
+    # anomalies: {label: (ids, count)}, until paged_report turns it into the first page.
+    # Missing rows are listed once, there
+    return {
+        'insights': insights,
+        'correlations': correlations,
+        'anomalies': anomalies,
+        'missing_data': missing_data_formatted
+    }
+
+# Anomaly listings. Reports return only the first page of each reason; the
+# full per-reason id lists are cached inside the report entry itself, whose
+# key is the listing token /anomaly_rows pages through them with, so a
+# listing lives exactly as long as its report.
+ANOMALY_PAGE_SIZE = int(os.getenv("ANOMALY_PAGE_SIZE", 50))  # Rows per reason returned inline
+ANOMALY_PAGE_MAX = int(os.getenv("ANOMALY_PAGE_MAX", 500))
+OUTLIER_LABEL = 'Numeric outlier detected'
+DUPLICATE_LABEL = 'Duplicate row detected'
+MISSING_LABEL = 'Missing data detected'
+ANOMALY_REASON_KEYS = {OUTLIER_LABEL: 'outlier', DUPLICATE_LABEL: 'duplicate', MISSING_LABEL: 'missing'}
+
+def date_label(col):
+    return f"Unrealistic date detected in '{col}'"
+
+def reason_key(label):
+    if label in ANOMALY_REASON_KEYS:
+        return ANOMALY_REASON_KEYS[label]
+    if label.startswith("Unrealistic date detected in '"):
+        return 'date:' + label[len("Unrealistic date detected in '"):-1]
+    return label
+
+def rows_by_id(table_name, ids):
+    # Listed rows are always read back from the table, so the inline first
+    # page and /anomaly_rows pages come out exactly alike
+    if not ids:
+        return {}
+    with pool.connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"SELECT * FROM `{table_name}` WHERE id IN ({', '.join(['%s'] * len(ids))})", ids)
+        return {row['id']: row for row in cursor.fetchall()}
+
+def paged_report(table_name, listing, report):
+    # listing: the cache key the report is stored under
+    id_lists, summary, pages = {}, [], {}
+    for label, (ids, count) in report['anomalies'].items():
+        if not count:
+            continue
+        ids = np.sort(ids)
+        key = reason_key(label)
+        id_lists[key] = {'label': label, 'ids': ids}
+        pages[label] = [int(row_id) for row_id in ids[:ANOMALY_PAGE_SIZE]]
+        summary.append({
+            'reason': key,
+            'label': label,
+            'count': count,
+            'next_cursor': encode_page_cursor(pages[label][-1]) if len(ids) > len(pages[label]) else None
+        })
+
+    rows = rows_by_id(table_name, sorted(set().union(*pages.values())))
+    first_page = [{**rows[row_id], 'anomaly_reason': label} for label, page in pages.items() for row_id in page if row_id in rows]
+    duplicate_rows = [rows[row_id] for row_id in pages.get(DUPLICATE_LABEL, []) if row_id in rows]
+    return {
+        **report,
+        'anomalies': first_page,
+        'anomaly_summary': summary,
+        'anomaly_listing': listing,
+        'anomaly_ids': {'table_name': table_name, 'reasons': id_lists},  # Not sent; see analyze_table
+        # Values of the listed duplicate rows, by column and row id
+        'duplicates': {insight['column']: {row['id']: row.get(insight['column']) for row in duplicate_rows} for insight in report['insights']}
+    }
+
+# Streaming full analysis. Pass 1 settles column types, missing counts, row
+# hashes and a bounded fitting sample; pass 2 re-reads the table with known
+# types and accumulates everything else per chunk.
+ANALYZE_FIT_ROWS = int(os.getenv("ANALYZE_FIT_ROWS", 100000))  # Max rows IsolationForest is fitted on
+ANALYZE_MODE_CAPACITY = int(os.getenv("ANALYZE_MODE_CAPACITY", 100000))  # Distinct values tracked per column for modes
+
+def missing_mask(chunk):
+    return chunk.isna() | chunk.isin(['', 'NULL'])
+
+def row_hashes(chunk, missing):
+    return pd.util.hash_pandas_object(chunk.where(~missing, None), index=False).to_numpy()
+
+def chunk_kinds(chunk, missing):
+    # Per column, how many values of this chunk rule out the numeric and the
+    # datetime kind. Counts rather than flags, so an edit can tell when the
+    # last value ruling a kind out is gone
+    counts = {}
+    for col in chunk.columns:
+        raw = chunk[col]
+        # Same rule as pd.to_numeric(errors='ignore'): every non-null value must parse
+        not_numeric = int((pd.to_numeric(raw, errors='coerce').isna() & raw.notna()).sum())
+        present = raw[~missing[col]]
+        inferred = pd.api.types.infer_dtype(present, skipna=True)
+        if inferred in ('datetime', 'datetime64', 'empty'):
+            not_datetime = 0
+        elif inferred.startswith('mixed'):
+            not_datetime = int((~present.map(lambda value: isinstance(value, (datetime, np.datetime64)))).sum())
+        else:
+            not_datetime = len(present)
+        counts[col] = (not_numeric, not_datetime)
+    return pd.DataFrame(counts, index=['not_numeric', 'not_datetime'])
+
+def inferred_kind(ruled_out):
+    # ruled_out: a column of chunk_kinds counts
+    return 'numeric' if not ruled_out['not_numeric'] else 'datetime' if not ruled_out['not_datetime'] else 'object'
+
+def declared_kinds(table_name):
+    # Tables created by the typed upload path carry trustworthy column types,
+    # so their kinds come from the schema instead of parsing every value
+    with pool.connection() as conn, conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT TABLE_COMMENT FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+            (table_name,)
+        )
+        row = cursor.fetchone()
+        if not row or row['TABLE_COMMENT'] != TYPED_TABLE_COMMENT:
+            return None
+        cursor.execute(f"DESCRIBE `{table_name}`;")
+        columns = cursor.fetchall()
+    kinds = {}
+    for column in columns:
+        col_type = column['Type'].lower()
+        if is_numeric_sql_type(col_type):
+            kinds[column['Field']] = 'numeric'
+        elif col_type.startswith(('date', 'datetime', 'timestamp')):
+            kinds[column['Field']] = 'datetime'
+        else:
+            kinds[column['Field']] = 'object'
+    return kinds
+
+def apply_kinds(chunk, kinds, missing):
+    typed = {}
+    for col, kind in kinds.items():
+        values = chunk[col].where(~missing[col])
+        if kind == 'numeric':
+            typed[col] = pd.to_numeric(values, errors='coerce')
+        elif kind == 'datetime':
+            typed[col] = pd.to_datetime(values, errors='coerce')
+        else:
+            typed[col] = values.astype(object).where(~missing[col], np.nan)
+    return pd.DataFrame(typed, index=chunk.index)
+
+
+class CoMoments:
+    """Running means and co-moment matrix, merged chunk by chunk (Chan et al.)."""
+
+    def __init__(self, width):
+        self.n = 0
+        self.mean = np.zeros(width)
+        self.comoment = np.zeros((width, width))
+
+    def update(self, values):
+        n_b = len(values)
+        if n_b == 0:
+            return
+        mean_b = values.mean(axis=0)
+        centred = values - mean_b
+        comoment_b = centred.T @ centred
+        n = self.n + n_b
+        delta = mean_b - self.mean
+        self.comoment += comoment_b + np.outer(delta, delta) * self.n * n_b / n
+        self.mean += delta * n_b / n
+        self.n = n
+
+    def add(self, row):
+        self.n += 1
+        delta = row - self.mean
+        self.mean += delta / self.n
+        self.comoment += np.outer(delta, row - self.mean)
+
+    def remove(self, row):
+        # Exact inverse of add()
+        if self.n <= 1:
+            self.__init__(len(self.mean))
+            return
+        mean = (self.mean * self.n - row) / (self.n - 1)
+        self.comoment -= np.outer(row - mean, row - self.mean)
+        self.mean, self.n = mean, self.n - 1
+
+    def correlation(self):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            std = np.sqrt(np.diag(self.comoment))
+            corr = self.comoment / np.outer(std, std)
+        corr[~np.isfinite(corr)] = np.nan
+        return corr
+
+
+def most_common_value(counter):
+    if not counter:
+        return None
+    top = max(counter.values())
+    candidates = [value for value, count in counter.items() if count == top]
+    try:
+        return to_native(min(candidates))  # pandas' mode()[0] is the smallest of the tied values
+    except TypeError:
+        return to_native(candidates[0])
+
+def group_weight(size):
+    # Rows a duplicate group of this size contributes to the duplicate count
+    return size if size > 1 else 0
+
+
+# Incremental maintenance. A full streamed analysis leaves its accumulators
+# behind so a single edited row can be folded in without re-reading the table.
+ANALYSIS_STATE_TABLES = int(os.getenv("ANALYSIS_STATE_TABLES", 4))  # Tables whose analysis state is kept in memory
+
+class AnalysisState:
+    """Per-table accumulators of a full analysis, keyed by row position, that
+    /update_record patches one row at a time. Edits only touch the accumulators;
+    the modes, Cramér's V scores and outlier flags they invalidate are
+    recomputed by report(), which runs on the next analyze_table."""
+
+    def __init__(self, version, kinds, hashes, ids, missing_data, duplicate_count, flags,
+                 value_counts, moments, iso_forest, codes, code_index, skipped, scores, incomplete, time_budget,
+                 ruled_out=None):
+        self.version = version
+        self.kinds = kinds
+        self.ruled_out = ruled_out  # chunk_kinds counts when kinds were inferred rather than declared
+        self.columns = list(kinds)
+        self.numeric_cols = [col for col in self.columns if kinds[col] == 'numeric']
+        self.model_cols = model_columns(self.numeric_cols)
+        self.date_cols = [col for col in self.columns if kinds[col] == 'datetime']
+        self.categorical_cols = [col for col in self.columns if kinds[col] == 'object']
+        self.hashes = hashes
+        self.ids = ids
+        self.missing_data = missing_data
+        self.duplicate_count = duplicate_count
+        self.flags = flags  # {reason label: boolean mask over row positions}
+        self.counts = {label: int(mask.sum()) for label, mask in flags.items()}
+        self.value_counts = value_counts
+        self.common_patterns = {col: most_common_value(value_counts[col]) for col in self.columns}
+        self.moments = moments
+        self.iso_forest = iso_forest
+        self.codes = codes
+        self.code_index = code_index
+        self.skipped = skipped
+        self.scores = scores
+        self.incomplete = incomplete
+        self.time_budget = time_budget
+        self.sorted_ids = self.id_order = None
+        self.hash_order = self.sorted_hashes = None
+        self.rehashed = set()  # Positions whose hash changed since hash_order was built
+        self.stale_modes, self.stale_pairs = set(), set()
+        self.unscored = {}  # Position -> model features of edited rows, scored together by report()
+        self.model_info = None
+
+    def index_rows(self):
+        self.id_order = np.argsort(self.ids, kind='stable')
+        self.sorted_ids = self.ids[self.id_order]
+
+    def position(self, row_id):
+        i = np.searchsorted(self.sorted_ids, row_id)
+        if i == len(self.sorted_ids) or self.sorted_ids[i] != row_id:
+            raise KeyError(f"Row {row_id} is not part of the analysed table")
+        return int(self.id_order[i])
+
+    def frame(self, rows):
+        return pd.DataFrame(rows, columns=self.columns, index=[self.position(row['id']) for row in rows], dtype=object)
+
+    def hash_group(self, row_hash):
+        # Positions of the rows that currently hash to row_hash: a hash-sorted
+        # index, built on the first edit, plus the positions edited since
+        if self.hash_order is None:
+            self.hash_order = np.argsort(self.hashes, kind='stable')
+            self.sorted_hashes = self.hashes[self.hash_order]
+            self.rehashed.clear()
+        start = np.searchsorted(self.sorted_hashes, row_hash, 'left')
+        stop = np.searchsorted(self.sorted_hashes, row_hash, 'right')
+        positions = np.union1d(self.hash_order[start:stop], np.fromiter(self.rehashed, dtype=np.int64, count=len(self.rehashed)))
+        return positions[self.hashes[positions] == row_hash]
+
+    def report(self):
+        for col in self.stale_modes:
+            self.common_patterns[col] = most_common_value(self.value_counts[col])
+        self.stale_modes.clear()
+        pairs = [pair for pair in self.stale_pairs if all(col in self.codes for col in pair)]
+        self.scores.update({(col1, col2): score for col1, col2, score in score_pairs(pairs, self.codes)})
+        self.stale_pairs.clear()
+        if self.unscored:
+            features = pd.DataFrame(list(self.unscored.values()), columns=self.model_cols)
+            for position, prediction in zip(self.unscored, self.iso_forest.predict(features)):
+                self.set_flag(OUTLIER_LABEL, position, prediction == -1)
+            self.unscored.clear()
+
+        anomalies = {label: (listed_ids(self.ids, mask), self.counts[label]) for label, mask in self.flags.items()}
+        correlations = []
+        if self.numeric_cols:
+            correlations.append(numerical_correlation(pd.DataFrame(self.moments.correlation(), index=self.numeric_cols, columns=self.numeric_cols)))
+        if self.categorical_cols:
+            correlations += categorical_entries(list(self.codes), self.scores, self.skipped, self.incomplete)
+        report = assemble_report(self.columns, self.missing_data, self.duplicate_count, self.common_patterns,
+                                 anomalies, correlations)
+        if self.model_info:
+            report['anomaly_model'] = self.model_info
+        return report
+
+    def apply_edit(self, old_row, new_row):
+        old, new = self.frame([old_row]), self.frame([new_row])
+        position = int(new.index[0])
+        old_missing, new_missing = missing_mask(old), missing_mask(new)
+
+        # **Inferred kinds**: an edit that would change a column's kind can't be
+        # patched in; raising drops the state so the next analysis starts over
+        edited = [col for col in self.columns if old_row[col] != new_row[col]]
+        if self.ruled_out is not None and edited:
+            self.ruled_out[edited] += chunk_kinds(new[edited], new_missing[edited]) - chunk_kinds(old[edited], old_missing[edited])
+            for col in edited:
+                kind = inferred_kind(self.ruled_out[col])
+                if kind != self.kinds[col]:
+                    raise ValueError(f"column '{col}' is now {kind}, not {self.kinds[col]}")
+
+        old_typed, new_typed = apply_kinds(old, self.kinds, old_missing), apply_kinds(new, self.kinds, new_missing)
+
+        # **Missing counts & value frequencies**
+        for col in self.columns:
+            self.missing_data[col] += int(new_missing[col].iloc[0]) - int(old_missing[col].iloc[0])
+            old_value, new_value = old_typed[col].iloc[0], new_typed[col].iloc[0]
+            if pd.isna(old_value) and pd.isna(new_value) or old_value == new_value:
+                continue
+            counts = self.value_counts[col]
+            if pd.notna(old_value) and counts.get(old_value):
+                counts[old_value] -= 1
+                if not counts[old_value]:
+                    del counts[old_value]
+            if pd.notna(new_value):
+                counts[new_value] += 1
+            self.stale_modes.add(col)
+
+        self.set_flag(MISSING_LABEL, position, new_missing.iloc[0].any())
+
+        # **Duplicate groups**: only the row's old and new hash groups can change
+        old_hash, new_hash = self.hashes[position], row_hashes(new, new_missing)[0]
+        if old_hash != new_hash:
+            self.hashes[position] = new_hash
+            self.rehashed.add(position)
+            left, joined = self.hash_group(old_hash), self.hash_group(new_hash)
+            self.duplicate_count += (group_weight(len(left)) - group_weight(len(left) + 1)
+                                     + group_weight(len(joined)) - group_weight(len(joined) - 1))
+            if len(left) == 1:
+                self.set_flag(DUPLICATE_LABEL, left[0], False)
+            for p in joined if len(joined) == 2 else [position]:
+                self.set_flag(DUPLICATE_LABEL, p, len(joined) > 1)
+
+        # **Co-moments & outliers**: the stored model scores just the edited rows
+        if self.numeric_cols:
+            old_numeric = old_typed[self.numeric_cols].fillna(0)
+            new_typed[self.numeric_cols] = new_typed[self.numeric_cols].fillna(0)
+            self.moments.remove(old_numeric.to_numpy(dtype=np.float64)[0])
+            self.moments.add(new_typed[self.numeric_cols].to_numpy(dtype=np.float64)[0])
+            if self.iso_forest is not None:
+                self.unscored[position] = new_typed[self.model_cols].to_numpy(dtype=np.float64)[0]
+
+        for col in self.date_cols:
+            year = new_typed[col].dt.year.iloc[0]
+            self.set_flag(date_label(col), position, year < 1900 or year > 2100)
+
+        # **Cramér's V**: recode the row; pairs touching changed columns are rescored by report()
+        changed = set()
+        for col in list(self.codes):
+            values, _ = self.codes[col]
+            value = new_typed[col].iloc[0]
+            code = -1 if pd.isna(value) else self.code_index[col].setdefault(value, len(self.code_index[col]))
+            if len(self.code_index[col]) > CRAMERS_MAX_CARDINALITY:
+                del self.codes[col]
+                self.skipped[col] = f"more than {CRAMERS_MAX_CARDINALITY} distinct values"
+                self.scores = {pair: score for pair, score in self.scores.items() if col not in pair}
+                continue
+            if values[position] != code:
+                values[position] = code
+                self.codes[col] = (values, len(self.code_index[col]))
+                changed.add(col)
+        self.stale_pairs.update(pair for pair in combinations(self.codes, 2) if changed.intersection(pair))
+
+    def set_flag(self, label, position, flagged):
+        mask = self.flags[label]
+        if mask[position] != flagged:
+            mask[position] = flagged
+            self.counts[label] += 1 if flagged else -1
+
+
+analysis_states = OrderedDict()
+analysis_states_lock = threading.Lock()
+
+def remember_analysis_state(table_name, state):
+    with analysis_states_lock:
+        analysis_states[table_name] = state
+        analysis_states.move_to_end(table_name)
+        while len(analysis_states) > ANALYSIS_STATE_TABLES:
+            analysis_states.popitem(last=False)
+
+def forget_analysis_state(table_name):
+    with analysis_states_lock:
+        return analysis_states.pop(table_name, None)
+
+def carry_analysis_state(table_name, previous_version, version, old_row, new_row):
+    # Folds one edited row into the stored state and moves it to the new
+    # version; the report itself waits for the next analyze_table
+    state = forget_analysis_state(table_name)  # Held exclusively while patching
+    if state is None or state.version != previous_version or old_row is None or new_row is None:
+        return
+    if old_row['id'] != new_row['id']:
+        return  # Row identity changed; positions can't be trusted
+    started = time.perf_counter()
+    try:
+        state.apply_edit(old_row, new_row)
+    except Exception as e:
+        print(f"Dropping analysis state for {table_name}: {e}")
+        return
+    record_span('analysis_incremental_update', time.perf_counter() - started)
+    state.version = version
+    remember_analysis_state(table_name, state)
+
+def analysis_state_report(table_name, version, time_budget):
+    # Full-analysis report from the carried state, or None when there is no
+    # state for this version and budget
+    state = forget_analysis_state(table_name)
+    if state is None:
+        return None
+    try:
+        if state.version != version or state.time_budget != time_budget:
+            return None
+        started = time.perf_counter()
+        report = state.report()
+        report['stage_timings'] = {'incremental_report': round(time.perf_counter() - started, 4)}
+        return report
+    finally:
+        remember_analysis_state(table_name, state)
+
+def build_streamed_analysis(table_name, fit_rows=ANALYZE_FIT_ROWS, time_budget=None):
+    # **Pass 1**: types, missing counts, row hashes, fitting sample
+    started = time.perf_counter()
+    timings = {}
+    version = table_version(table_name)
+    rng = np.random.default_rng(0)
+    declared = declared_kinds(table_name)
+    ruled_out, missing_data, hashes, ids = None, None, [], []
+    fit_sample, fit_keys = None, np.empty(0)
+    total_rows = 0
+    for chunk in table_batches(table_name):
+        chunk.index = pd.RangeIndex(total_rows, total_rows + len(chunk))
+        total_rows += len(chunk)
+        missing = missing_mask(chunk)
+        chunk_missing = missing.sum()
+        missing_data = chunk_missing if missing_data is None else missing_data + chunk_missing
+        hashes.append(row_hashes(chunk, missing))
+        if 'id' in chunk.columns:
+            ids.append(row_ids(chunk))
+
+        if declared is None:
+            counts = chunk_kinds(chunk, missing)
+            ruled_out = counts if ruled_out is None else ruled_out + counts
+
+        fit_keys = np.concatenate([fit_keys, rng.random(len(chunk))])
+        fit_sample = chunk if fit_sample is None else pd.concat([fit_sample, chunk])
+        if len(fit_sample) > fit_rows:
+            keep = np.sort(np.argpartition(fit_keys, fit_rows)[:fit_rows])
+            fit_sample, fit_keys = fit_sample.iloc[keep], fit_keys[keep]
+
+    if total_rows == 0:
+        return build_analysis(pd.DataFrame())
+
+    kinds = declared or {col: inferred_kind(ruled_out[col]) for col in ruled_out.columns}
+    columns = list(kinds)
+    numeric_cols = [col for col in columns if kinds[col] == 'numeric']
+    model_cols = model_columns(numeric_cols)
+    date_cols = [col for col in columns if kinds[col] == 'datetime']
+    categorical_cols = [col for col in columns if kinds[col] == 'object']
+
+    # The outlier fit runs while the duplicate groups are settled and pass 2
+    # starts; only pass 2's outlier stage waits for it
+    def fit_model():
+        nonlocal fit_sample
+        fit_started = time.perf_counter()
+        fit_frame = apply_kinds(fit_sample, kinds, missing_mask(fit_sample))
+        fit_sample = None
+        fitted = anomaly_model(table_name, fit_frame[model_cols].fillna(0), total_rows)
+        timings['outlier_fit'] = time.perf_counter() - fit_started
+        return fitted
+
+    fitting = stage_executor.submit(fit_model) if model_cols else None
+
+    missing_data = {col: int(count) for col, count in missing_data.items()}
+    ids = np.concatenate(ids) if ids else None
+    hashes = np.concatenate(hashes)
+    unique_hashes, hash_counts = np.unique(hashes, return_counts=True)
+    duplicate_hashes = unique_hashes[hash_counts > 1]
+    duplicate_count = int(hash_counts[hash_counts > 1].sum())
+    del unique_hashes, hash_counts
+
+    timings['pass_1'] = time.perf_counter() - started
+    stage_started = time.perf_counter()
+
+    # **Pass 2**: anomaly flags, modes, co-moments and categorical codes over
+    # typed chunks. Each chunk's work is a stage graph; stages write disjoint
+    # accumulators, so they need no locking
+    labels = [OUTLIER_LABEL, *(date_label(col) for col in date_cols), DUPLICATE_LABEL, MISSING_LABEL]
+    flags = {label: np.zeros(total_rows, dtype=bool) for label in labels}
+    value_counts = {col: Counter() for col in columns}
+    moments = CoMoments(len(numeric_cols))
+    category_codes = {col: IncrementalCodes() for col in categorical_cols}
+
+    def chunk_stages(chunk, rows):
+        def missing():
+            return missing_mask(chunk)
+
+        def typed(missing):
+            return apply_kinds(chunk, kinds, missing)
+
+        def row_flags(missing):
+            flags[MISSING_LABEL][rows] = missing.any(axis=1).to_numpy()
+            if len(duplicate_hashes):
+                flags[DUPLICATE_LABEL][rows] = np.isin(row_hashes(chunk, missing), duplicate_hashes)
+
+        def modes(typed):
+            for col in columns:
+                counts = value_counts[col]
+                counts.update(typed[col].value_counts(sort=False).to_dict())
+                if len(counts) > 2 * ANALYZE_MODE_CAPACITY:
+                    value_counts[col] = Counter(dict(counts.most_common(ANALYZE_MODE_CAPACITY)))
+
+        def numbers(typed):
+            return typed[numeric_cols].fillna(0)
+
+        def comoments(numbers):
+            if numeric_cols:
+                moments.update(numbers.to_numpy(dtype=np.float64))
+
+        def outliers(numbers):
+            if fitting is not None:
+                iso_forest, _ = fitting.result()
+                flags[OUTLIER_LABEL][rows] = iso_forest.predict(numbers[model_cols]) == -1
+
+        def dates(typed):
+            for col in date_cols:
+                years = typed[col].dt.year
+                flags[date_label(col)][rows] = ((years < 1900) | (years > 2100)).to_numpy()
+
+        def codes(typed):
+            for col in categorical_cols:
+                category_codes[col].update(typed[col])
+
+        return {
+            'missing': (missing, []),
+            'typed': (typed, ['missing']),
+            'row_flags': (row_flags, ['missing']),
+            'modes': (modes, ['typed']),
+            'numbers': (numbers, ['typed']),
+            'comoments': (comoments, ['numbers']),
+            'outliers': (outliers, ['numbers']),
+            'dates': (dates, ['typed']),
+            'codes': (codes, ['typed'])
+        }
+
+    stage_seconds = Counter()
+    offset = 0
+    for chunk in table_batches(table_name):
+        rows = slice(offset, offset + len(chunk))
+        chunk.index = pd.RangeIndex(rows.start, rows.stop)
+        offset = rows.stop
+        _, chunk_timings = run_stages(chunk_stages(chunk, rows), record=False)
+        stage_seconds.update(chunk_timings)
+
+    iso_forest, model_meta = fitting.result() if fitting is not None else (None, None)
+    timings.update((f'pass_2_{name}', seconds) for name, seconds in stage_seconds.items())
+    timings['pass_2'] = time.perf_counter() - stage_started
+    stage_started = time.perf_counter()
+
+    codes, skipped, scores, incomplete = {}, {}, {}, False
+    for col in categorical_cols:
+        col_codes, reason = category_codes[col].result()
+        if reason:
+            skipped[col] = reason
+        else:
+            codes[col] = col_codes
+    if categorical_cols:
+        scores, incomplete = cramers_v_matrix(codes, time_budget)
+    timings['correlations'] = time.perf_counter() - stage_started
+
+    state = AnalysisState(
+        version, kinds, hashes, ids, missing_data, duplicate_count, flags, value_counts,
+        moments, iso_forest, codes, {col: category_codes[col].index for col in codes},
+        skipped, scores, incomplete, time_budget, None if declared else ruled_out
+    )
+    state.model_info = model_info(model_meta) if model_meta else None
+    report = state.report()
+    timings['total'] = time.perf_counter() - started
+    record_timings('analysis', timings)
+    report['stage_timings'] = {name: round(seconds, 4) for name, seconds in timings.items()}
+
+    # Kept only when no edit landed while the table was being read
+    if ids is not None and not np.isnan(ids).any() and table_version(table_name) == version:
+        state.index_rows()
+        remember_analysis_state(table_name, state)
+    return report
+
+# Approximate analysis for large tables: fit on a uniform sample, then score
+# the full table in streamed batches.
+ANALYZE_SAMPLE_THRESHOLD = int(os.getenv("ANALYZE_SAMPLE_THRESHOLD", 200000))  # Rows above which sampling kicks in
+ANALYZE_SAMPLE_SIZE = int(os.getenv("ANALYZE_SAMPLE_SIZE", 50000))
+Z_95 = 1.959964
+
+def estimated_row_count(table_name):
+    # InnoDB's statistics estimate; avoids a COUNT(*) scan just to pick a mode
+    with pool.connection() as conn, conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+            (table_name,)
+        )
+        row = cursor.fetchone()
+    return int(row['TABLE_ROWS'] or 0) if row else 0
+
+def wilson_interval(successes, n, z=Z_95):
+    if n == 0:
+        return [None, None]
+    p = successes / n
+    denom = 1 + z ** 2 / n
+    centre = (p + z ** 2 / (2 * n)) / denom
+    half = z * np.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2)) / denom
+    return [float(max(0.0, centre - half)), float(min(1.0, centre + half))]
+
+def pearson_interval(r, n, z=Z_95):
+    # Fisher z-transform
+    if r is None or n <= 3 or abs(r) >= 1:
+        return [r, r]
+    fz = np.arctanh(r)
+    se = 1 / np.sqrt(n - 3)
+    return [float(np.tanh(fz - z * se)), float(np.tanh(fz + z * se))]
+
+def sample_table(table_name, sample_size, seed=0):
+    # One streamed pass: bottom-k reservoir sample plus exact row and missing
+    # counts and, from per-row hashes as in pass 1 of the full analysis, the
+    # exact duplicate rows
+    rng = np.random.default_rng(seed)
+    sample, keys = None, np.empty(0)
+    total_rows = 0
+    missing = None
+    hashes, ids = [], []
+    for batch in table_batches(table_name):
+        total_rows += len(batch)
+        batch_missing_mask = missing_mask(batch)
+        batch_missing = batch_missing_mask.sum()
+        missing = batch_missing if missing is None else missing + batch_missing
+        hashes.append(row_hashes(batch, batch_missing_mask))
+        if 'id' in batch.columns:
+            ids.append(row_ids(batch))
+
+        keys = np.concatenate([keys, rng.random(len(batch))])
+        sample = batch if sample is None else pd.concat([sample, batch], ignore_index=True)
+        if len(sample) > sample_size:
+            keep = np.sort(np.argpartition(keys, sample_size)[:sample_size])
+            sample, keys = sample.iloc[keep].reset_index(drop=True), keys[keep]
+    missing = {col: int(count) for col, count in (missing.items() if missing is not None else [])}
+
+    hashes = np.concatenate(hashes) if hashes else np.empty(0, dtype=np.uint64)
+    unique_hashes, hash_counts = np.unique(hashes, return_counts=True)
+    duplicate_mask = np.isin(hashes, unique_hashes[hash_counts > 1])
+    duplicates = (listed_ids(np.concatenate(ids) if ids else None, duplicate_mask), int(duplicate_mask.sum()))
+    return sample, total_rows, missing, duplicates
+
+def build_sampled_analysis(table_name, sample_size, time_budget=None):
+    started = time.perf_counter()
+    kinds = declared_kinds(table_name)
+    sample, total_rows, missing, duplicates = sample_table(table_name, sample_size)
+    sampling_seconds = time.perf_counter() - started
+    if sample is None:
+        return build_analysis(pd.DataFrame())
+    n = len(sample)
+
+    # Fit the outlier model on the sample and score every row of the table, as
+    # the outlier stage of the sample's own analysis
+    model = {}
+
+    def score_table(features):
+        iso_forest, model['meta'] = anomaly_model(table_name, features, total_rows)
+        outlier_ids, outlier_count = [], 0
+        read = list(features.columns) + (['id'] if 'id' in sample.columns else [])  # Only the columns scoring needs
+        for batch in table_batches(table_name, read):
+            numbers = batch[features.columns].apply(pd.to_numeric, errors='coerce').fillna(0)
+            flagged = iso_forest.predict(numbers) == -1
+            outlier_ids.append(listed_ids(row_ids(batch), flagged))
+            outlier_count += int(flagged.sum())
+        return {OUTLIER_LABEL: (np.concatenate(outlier_ids), outlier_count)}
+
+    result = build_analysis(sample, time_budget, score_table, kinds)
+    if 'meta' in model:
+        result['anomaly_model'] = model_info(model['meta'])
+    record_timings('analysis', {'sampling': sampling_seconds})
+    result['stage_timings'].update({
+        'sampling': round(sampling_seconds, 4),
+        'total': round(time.perf_counter() - started, 4)
+    })
+    typed_sample = typed_frame(sample, kinds)
+
+    # Missing and duplicate counts come from the full scan; modes are sample estimates.
+    # A sample can't estimate duplicates: a pair only shows up if both copies are drawn
+    result['anomalies'][DUPLICATE_LABEL] = duplicates
+    common_patterns = {insight['column']: insight['most_common'] for insight in result['insights']}
+    result['insights'] = assemble_report(list(common_patterns), missing, duplicates[1], common_patterns, {}, [])['insights']
+    mode_bounds = {}
+    for insight in result['insights']:
+        col = insight['column']
+        if insight['most_common'] is not None:
+            share = int((typed_sample[col] == insight['most_common']).sum())
+            mode_bounds[col] = {'sample_share': share / n, 'share_bounds': wilson_interval(share, n)}
+    result['missing_data'] = [{'column': col, 'missing_count': count} for col, count in missing.items() if count > 0]
+
+    correlation_bounds = {}
+    for correlation in result['correlations']:
+        if correlation['correlation_type'] == 'Numerical':
+            matrix = correlation['correlation_matrix']
+            correlation_bounds = {
+                col: {other: pearson_interval(r, n) for other, r in row.items()} for col, row in matrix.items()
+            }
+            correlation['correlation_bounds'] = correlation_bounds
+
+    result['approximate'] = {
+        'mode': 'sample',
+        'sample_size': n,
+        'total_rows': total_rows,
+        'sampling_fraction': n / total_rows if total_rows else None,
+        'confidence_level': 0.95,
+        'exact': ['missing_values', 'missing_data', 'duplicates', 'duplicate_row_listing', 'numeric_outliers'],
+        'estimated': ['most_common', 'correlations', 'missing_row_listing'],
+        'most_common_bounds': mode_bounds,
+        'outlier_model': 'IsolationForest fitted on the sample, applied to every row'
+    }
+    return result
+
+# CPU-heavy analysis (analyze_table and the table profiles) can run in a pool of
+# ANALYSIS_PROCESSES processes, so it stops competing for the GIL with the I/O
+# endpoints of the worker that received it; 0 runs it on the request thread.
+# The parent keeps the result cache, the paged listings and the incremental
+# state: a job is handed the table version and returns its result and state.
+ANALYSIS_PROCESSES = int(os.getenv("ANALYSIS_PROCESSES", 0))
+analysis_process_pool = None
+analysis_process_lock = threading.Lock()
+
+def init_analysis_worker():
+    global analysis_worker
+    analysis_worker = True
+    warm_pair_processes()  # Cramér's V runs in here, on this process's own pool
+
+def run_analysis_job(build, table_name, version, args):
+    worker_versions.clear()
+    worker_versions[table_name] = version
+    result = build(table_name, *args)
+    return result, forget_analysis_state(table_name)
+
+def analysis_processes():
+    global analysis_process_pool
+    with analysis_process_lock:
+        if analysis_process_pool is None:
+            # spawn rather than fork: a fork of a threaded server can inherit locks held mid-request
+            analysis_process_pool = ProcessPoolExecutor(
+                max_workers=ANALYSIS_PROCESSES, mp_context=multiprocessing.get_context('spawn'), initializer=init_analysis_worker
+            )
+        return analysis_process_pool
+
+def reset_analysis_processes():
+    global analysis_process_pool
+    analysis_process_pool = None  # Belongs to the parent; a forked worker starts its own
+
+os.register_at_fork(after_in_child=reset_analysis_processes)
+
+def run_analysis(build, table_name, *args):
+    if not ANALYSIS_PROCESSES or analysis_worker:
+        return build(table_name, *args)
+    version = table_version(table_name)
+    try:
+        with span('analysis_process'):
+            result, state = analysis_processes().submit(run_analysis_job, build, table_name, version, args).result()
+    except BrokenProcessPool:
+        reset_analysis_processes()  # A process died (e.g. OOM); the next job gets a fresh pool
+        raise
+    if 'stage_timings' in result:
+        record_timings('analysis', result['stage_timings'])  # Spans recorded in the process stay there
+    if state is not None and table_version(table_name) == version:
+        remember_analysis_state(table_name, state)
+    return result
+
 @app.route('/analyze_table', methods=['GET'])
 def analyze_table():
     table_name = request.args.get('table_name')
     if not table_name:
         return jsonify({'error': 'Table name is required'}), 400
     
+    mode = request.args.get('mode', 'auto')
+    if mode not in ('auto', 'full', 'sample'):
+        return jsonify({'error': "mode must be 'auto', 'full' or 'sample'"}), 400
+    sample_size = request.args.get('sample_size', str(ANALYZE_SAMPLE_SIZE))
+    if not sample_size.isdigit() or int(sample_size) < 1:
+        return jsonify({'error': 'sample_size must be a positive integer'}), 400
+    sample_size = int(sample_size)
+    time_budget = request.args.get('time_budget', type=float)  # Seconds allowed for the Cramér's V matrix
+
     try:
-        conn = pool.get_conn()
-        with conn.cursor() as cursor:
-            cursor.execute(f"SELECT * FROM `{table_name}`;")
-            rows = cursor.fetchall()
-            column_names = [desc[0] for desc in cursor.description]  # Fetch column names
-        
-        pool.release(conn)
-
-        # Create DataFrame from fetched rows
-        df = pd.DataFrame(rows, columns=column_names)
-
-        # Convert columns to appropriate types
-        df = df.apply(pd.to_numeric, errors='ignore')
-        df = df.replace({None: np.nan, 'NULL': np.nan, '': np.nan})  # Standardize missing values
-
-        insights = []
-        anomalies = []
-        missing_data_log = []
-
-        # **Missing Data Detection**
-        missing_data_rows = df[df.isnull().any(axis=1)]
-        missing_data = missing_data_rows.isnull().sum().to_dict()
-
-        # Format missing data
-        for _, row in missing_data_rows.iterrows():
-            missing_data_log.append({
-                **{k: (v if pd.notna(v) else None) for k, v in row.to_dict().items()},
-                'anomaly_reason': 'Missing data detected'
-            })
+        if mode == 'auto':
+            mode = 'sample' if estimated_row_count(table_name) > ANALYZE_SAMPLE_THRESHOLD else 'full'
+        if mode == 'sample':
+            build, args, params = build_sampled_analysis, (sample_size, time_budget), (mode, sample_size, time_budget)
+        else:
+            build, args, params = build_streamed_analysis, (ANALYZE_FIT_ROWS, time_budget), (mode, time_budget)
+        # cached_result by hand: the key doubles as the report's listing token
+        version = table_version(table_name)
+        key = result_key('analyze_table', table_name, version, *params)
+        result = analysis_cache.get(key)
+        if result is None:
+            report = analysis_state_report(table_name, version, time_budget) if mode == 'full' else None
+            result = paged_report(table_name, key, report or run_analysis(build, table_name, *args))
+            analysis_cache.set(key, result)
+        result = {name: value for name, value in result.items() if name != 'anomaly_ids'}
+        if request.args.get('format') == 'ndjson':
+            header = {key: value for key, value in result.items() if key != 'anomalies'}
+            return ndjson_response(header, result['anomalies'])
+        return jsonify(result), 200
 
-        # **Duplicate Detection**
-        duplicates = df[df.duplicated(keep=False)]
-        duplicate_count = duplicates.shape[0]
+    except Exception as e:
+        error_trace = traceback.format_exc()
+        print(error_trace)
+        return jsonify({'error': str(e), 'trace': error_trace}), 500
 
-        # **Most Common Values & Patterns**
-        common_patterns = {col: df[col].mode()[0] if not df[col].mode().empty else None for col in df.columns}
+@app.route('/anomaly_rows', methods=['GET'])
+def anomaly_rows():
+    # Next page of one anomaly reason from an analyze_table listing; only
+    # the rows of this page are read from the table
+    listing = request.args.get('listing')
+    reason = request.args.get('reason')
+    cursor_token = request.args.get('cursor')
+    limit = min(request.args.get('limit', ANOMALY_PAGE_SIZE, type=int), ANOMALY_PAGE_MAX)
+    if not listing or not reason:
+        return jsonify({'error': 'listing and reason are required'}), 400
+
+    report = analysis_cache.get(listing) if listing.startswith('analyze_table:') else None
+    if report is None:
+        return jsonify({'error': 'Listing expired; run analyze_table again'}), 404
+    stored = report['anomaly_ids']
+    if reason not in stored['reasons']:
+        return jsonify({'error': f"Unknown reason '{reason}'"}), 400
+    try:
+        after_id = decode_page_cursor(cursor_token) if cursor_token else None
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
 
-        # **Anomaly Detection (Numeric & Date)**
-        numeric_cols = df.select_dtypes(include=['number']).columns
-        if not df.empty and len(numeric_cols) > 0:
-            iso_forest = IsolationForest(contamination=0.05)
-            df[numeric_cols] = df[numeric_cols].fillna(0)  
-            anomaly_preds = iso_forest.fit_predict(df[numeric_cols])
+    try:
+        table_name, entry = stored['table_name'], stored['reasons'][reason]
+        ids = entry['ids']
+        start = int(np.searchsorted(ids, after_id, side='right')) if after_id is not None else 0
+        page_ids = [int(row_id) for row_id in ids[start:start + limit]]
+        found = rows_by_id(table_name, page_ids)
+        rows = [{**found[row_id], 'anomaly_reason': entry['label']} for row_id in page_ids if row_id in found]
+        has_more = start + limit < len(ids)
+        return jsonify({
+            'reason': reason,
+            'label': entry['label'],
+            'count': len(ids),
+            'rows': rows,
+            'has_more': has_more,
+            'next_cursor': encode_page_cursor(page_ids[-1]) if has_more else None
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-            anomalies += df[anomaly_preds == -1].apply(lambda row: {
-                **{k: (v if pd.notna(v) else None) for k, v in row.to_dict().items()},
-                'anomaly_reason': "Numeric outlier detected"
-            }, axis=1).tolist()
+@app.route('/score_rows', methods=['POST'])
+def score_rows():
+    # Scores rows against the table's stored anomaly model without refitting.
+    # Rows come either as JSON ({table_name, rows: [{column: value}]}) or as
+    # a CSV/XLSX file with a table_name form field; both are scored in batches.
+    if 'file' in request.files:
+        table_name = request.form.get('table_name')
+        file = request.files['file']
+        file_ext = file.filename.split('.')[-1].lower()
+        if file_ext not in ['csv', 'xlsx']:
+            return jsonify({'error': 'Only CSV and XLSX files are supported'}), 400
+        batches = read_upload_chunks(file, file_ext, SCORE_BATCH_ROWS)
+    else:
+        data = request.json or {}
+        table_name = data.get('table_name')
+        rows = data.get('rows') or []
+        batches = (pd.DataFrame(rows[start:start + SCORE_BATCH_ROWS]) for start in range(0, len(rows), SCORE_BATCH_ROWS))
 
-        date_cols = df.select_dtypes(include=['datetime']).columns
-        for col in date_cols:
-            unrealistic_dates = df[col].apply(lambda x: x.year < 1900 or x.year > 2100 if pd.notnull(x) else False)
-            anomalies += df[unrealistic_dates].apply(lambda row: {
-                **{k: (v if pd.notna(v) else None) for k, v in row.to_dict().items()},
-                'anomaly_reason': f"Unrealistic date detected in '{col}'"
-            }, axis=1).tolist()
-
-        # Include duplicates & missing data in anomalies
-        for _, row in duplicates.iterrows():
-            anomalies.append({
-                **{k: (v if pd.notna(v) else None) for k, v in row.to_dict().items()},
-                'anomaly_reason': "Duplicate row detected"
-            })
+    if not table_name:
+        return jsonify({'error': 'Table name is required'}), 400
+    meta = load_model_meta(table_name)
+    if meta is None:
+        return jsonify({'error': f'No anomaly model for {table_name}; run analyze_table first'}), 404
 
-        for _, row in missing_data_rows.iterrows():
-            anomalies.append({
-                **{k: (v if pd.notna(v) else None) for k, v in row.to_dict().items()},
-                'anomaly_reason': "Missing data detected"
-            })
+    if 'id' in meta['columns']:
+        return jsonify({'error': f'The anomaly model for {table_name} was fitted on id; run analyze_table to refit it'}), 409
 
-        # **Correlation Analysis**
-        correlations = []
-        numerical_cols = df.select_dtypes(include=['number']).columns.tolist()
-        if numerical_cols:
-            numerical_corr = df[numerical_cols].corr(method='pearson')
-            correlations.append({
-                'correlation_type': 'Numerical',
-                'correlation_matrix': numerical_corr.where(pd.notna(numerical_corr), None).to_dict()  # Replacing NaN with None
-            })
+    try:
+        model = load_model(meta)
+        columns = meta['columns']
+        results, offset = [], 0
+        for batch in batches:
+            batch.columns = [sql_column_name(col) for col in batch.columns]
+            absent = [col for col in columns if col not in batch.columns]
+            if absent:
+                return jsonify({'error': f"Missing columns: {', '.join(absent)}"}), 400
+            numbers = batch[columns].apply(pd.to_numeric, errors='coerce').fillna(0)
+            # predict() is decision_function() < 0; one pass gives both
+            scores = model.decision_function(numbers)
+            results += [
+                {'row': offset + i, 'score': float(score), 'anomaly': bool(score < 0)}
+                for i, score in enumerate(scores)
+            ]
+            offset += len(batch)
+        return jsonify({
+            'model': model_info(meta),
+            'scored_rows': len(results),
+            'anomaly_count': sum(result['anomaly'] for result in results),
+            'results': results
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-        categorical_cols = df.select_dtypes(include=['object']).columns.tolist()
-        if categorical_cols:
-            for col1, col2 in combinations(categorical_cols, 2):
-                cramer_v_score = cramers_v(df[col1], df[col2])
-                correlations.append({
-                    'correlation_type': 'Categorical',
-                    'columns': (col1, col2),
-                    'correlation_score': cramer_v_score if not np.isnan(cramer_v_score) else None  # Replace NaN with None
-                })
-
-        # **General Insights**
-        for col in df.columns:
-            insights.append({
-                'column': col,
-                'missing_values': missing_data.get(col, 0),
-                'duplicates': duplicate_count,
-                'insight_type': 'General',
-                'most_common': common_patterns.get(col, None),
-                'details': f"{missing_data.get(col, 0)} missing values, {duplicate_count} duplicates.",
-                'suggested_action': (
-                    'Fill missing values' if missing_data.get(col, 0) > 0 and duplicate_count == 0 
-                    else 'Remove duplicates' if duplicate_count > 0 and missing_data.get(col, 0) == 0 
-                    else 'Fill missing values, remove duplicates, and check anomalies.' if missing_data.get(col, 0) > 0 and duplicate_count > 0 
-                    else 'No suggestions'
-                )
-            })
 
-        # **Convert int64 to int for JSON compatibility**
-        def convert_int64_to_int(obj):
-            if isinstance(obj, dict):
-                return {k: convert_int64_to_int(v) for k, v in obj.items()}
-            elif isinstance(obj, list):
-                return [convert_int64_to_int(v) for v in obj]
-            elif isinstance(obj, np.int64):
-                return int(obj)
-            elif isinstance(obj, float) and np.isnan(obj):  # Convert NaN to None
-                return None
-            else:
-                return obj
-
-        missing_data_formatted = [
-            {'column': col, 'missing_count': missing_data.get(col, 0) if missing_data.get(col, 0) != np.nan else 0}
-            for col in df.columns if missing_data.get(col, 0) > 0
-        ]
-
-        return jsonify(convert_int64_to_int({
-            'insights': insights,
-            'correlations': correlations,
-            'anomalies': anomalies,
-            'duplicates': duplicates.to_dict(),
-            'missing_data': missing_data_formatted,
-            'logged_missing_data': missing_data_log
-        })), 200
 
-    except Exception as e:
-        error_trace = traceback.format_exc()
-        print(error_trace)
-        return jsonify({'error': str(e), 'trace': error_trace}), 500
 
 
 
 
+# Single-pass column profiling for the summary endpoints. The table is streamed
+# once through an unbuffered cursor and every column keeps bounded-size state.
+PROFILE_BATCH_ROWS = int(os.getenv("PROFILE_BATCH_ROWS", 50000))
+PROFILE_TOP_K = int(os.getenv("PROFILE_TOP_K", 50))
+PROFILE_SAMPLE_SIZE = int(os.getenv("PROFILE_SAMPLE_SIZE", 10000))  # Reservoir used for quantiles/histograms
+PROFILE_HISTOGRAM_BINS = int(os.getenv("PROFILE_HISTOGRAM_BINS", 20))
+PROFILE_QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+NUMERIC_SQL_TYPES = ('tinyint', 'smallint', 'mediumint', 'int', 'integer', 'bigint',
+                     'decimal', 'numeric', 'float', 'double', 'real', 'bit', 'year')
+
+def is_numeric_sql_type(col_type):
+    return col_type.lower().split('(')[0].split(' ')[0] in NUMERIC_SQL_TYPES
+
+
+class HyperLogLog:
+    def __init__(self, precision=14):
+        self.p = precision
+        self.m = 1 << precision
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def add(self, values):
+        if len(values) == 0:
+            return
+        hashes = pd.util.hash_pandas_object(values, index=False).to_numpy(dtype=np.uint64)
+        index = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        rest = (hashes << np.uint64(self.p)) >> np.uint64(11)  # Keep 53 bits so log2 is exact
+        max_rank = 64 - self.p + 1
+        with np.errstate(divide='ignore'):
+            bit_length = np.where(rest > 0, np.floor(np.log2(rest.astype(np.float64))) + 1, 0)
+        rank = np.where(rest > 0, 53 - bit_length + 1, max_rank).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def estimate(self):
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        raw = alpha * self.m ** 2 / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * self.m and zeros:
+            return int(round(self.m * np.log(self.m / zeros)))  # Linear counting for small cardinalities
+        return int(round(raw))
+
+
+class ColumnProfile:
+    def __init__(self, name, col_type, top_k, rng):
+        self.name = name
+        self.declared_numeric = is_numeric_sql_type(col_type)
+        self.top_k = top_k
+        self.capacity = max(10 * top_k, 1000)
+        self.rng = rng
+        self.count = 0
+        self.nulls = 0
+        self.counts = Counter()
+        self.counts_exact = True
+        self.hll = HyperLogLog()
+        self.numeric_count = 0
+        self.numeric_sum = 0.0
+        self.numeric_min = None
+        self.numeric_max = None
+        self.sample = np.empty(0)
+        self.sample_keys = np.empty(0)
+
+    def update(self, values):
+        self.count += len(values)
+        present = values[values.notna() & ~values.isin(['', 'NULL'])]
+        self.nulls += len(values) - len(present)
+        if present.empty:
+            return
+
+        self.hll.add(present.astype(str))
+        self.counts.update(present.value_counts(sort=False).to_dict())
+        if len(self.counts) > 2 * self.capacity:
+            self.counts = Counter(dict(self.counts.most_common(self.capacity)))
+            self.counts_exact = False
+
+        numbers = pd.to_numeric(present, errors='coerce').dropna().to_numpy(dtype=np.float64)
+        if len(numbers):
+            self.numeric_count += len(numbers)
+            self.numeric_sum += float(numbers.sum())
+            low, high = float(numbers.min()), float(numbers.max())
+            self.numeric_min = low if self.numeric_min is None else min(self.numeric_min, low)
+            self.numeric_max = high if self.numeric_max is None else max(self.numeric_max, high)
+            # Bottom-k by random key keeps a uniform sample without replacement
+            keys = np.concatenate([self.sample_keys, self.rng.random(len(numbers))])
+            pooled = np.concatenate([self.sample, numbers])
+            if len(pooled) > PROFILE_SAMPLE_SIZE:
+                keep = np.argpartition(keys, PROFILE_SAMPLE_SIZE)[:PROFILE_SAMPLE_SIZE]
+                keys, pooled = keys[keep], pooled[keep]
+            self.sample_keys, self.sample = keys, pooled
+
+    def is_numeric(self):
+        present = self.count - self.nulls
+        return self.declared_numeric or (present > 0 and self.numeric_count == present)
+
+    def result(self):
+        top = self.counts.most_common(self.top_k)
+        profile = {
+            'type': 'numeric' if self.is_numeric() else 'categorical',
+            'count': self.count,
+            'nulls': self.nulls,
+            'distinct_estimate': self.hll.estimate(),
+            'top_values': [{self.name: to_native(value), 'count': int(count)} for value, count in top],
+            'top_values_exact': self.counts_exact
+        }
+        if self.is_numeric() and self.numeric_count:
+            estimated = len(self.sample) < self.numeric_count
+            counts, edges = np.histogram(self.sample, bins=PROFILE_HISTOGRAM_BINS,
+                                         range=(self.numeric_min, self.numeric_max))
+            scale = self.numeric_count / len(self.sample)
+            profile.update({
+                'min': self.numeric_min,
+                'max': self.numeric_max,
+                'mean': self.numeric_sum / self.numeric_count,
+                'quantiles': {str(q): float(v) for q, v in zip(PROFILE_QUANTILES, np.quantile(self.sample, PROFILE_QUANTILES))},
+                'histogram': [
+                    {'start': float(edges[i]), 'end': float(edges[i + 1]), 'count': int(round(counts[i] * scale))}
+                    for i in range(len(counts))
+                ],
+                'quantiles_estimated': estimated
+            })
+        return profile
+
+
+def profile_table(table_name, top_k=PROFILE_TOP_K):
+    rng = np.random.default_rng(0)
+    with pool.connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"DESCRIBE `{table_name}`;")
+        columns = [(row['Field'], row['Type']) for row in cursor.fetchall()]
+    profiles = [ColumnProfile(name, col_type, top_k, rng) for name, col_type in columns]
+
+    for chunk in table_batches(table_name, batch_rows=PROFILE_BATCH_ROWS):
+        for profile in profiles:
+            profile.update(chunk[profile.name])
 
+    return {profile.name: profile.result() for profile in profiles}
 
 
 @app.route('/table_summary_extended', methods=['GET'])
@@ -258,30 +2490,16 @@ def table_summary_extended():
         table_name = request.args.get('table_name')
         if not table_name:
             return jsonify({'error': 'Table name is required'}), 400
+        top_k = request.args.get('top_k', type=int) if 'top_k' in request.args else PROFILE_TOP_K
+        if top_k is None or top_k < 1:  # get(type=int) gives None for non-integers
+            return jsonify({'error': 'top_k must be a positive integer'}), 400
 
-        conn = pool.get_conn()
-        cursor = conn.cursor()
-
-        # Get column names and data types
-        cursor.execute(f"DESCRIBE `{table_name}`;")
-        columns_info = cursor.fetchall()
-        columns = {row['Field']: row['Type'] for row in columns_info}
+        profiles = cached_result('profile', table_name, lambda: run_analysis(profile_table, table_name, top_k), top_k)
 
         summary = {}
-        for column, col_type in columns.items():
-            cursor.execute(f"SELECT `{column}`, COUNT(*) as count FROM `{table_name}` GROUP BY `{column}`;")
-            values = cursor.fetchall()
-
-            # Detect if column is numeric
-            is_numeric = any(char.isdigit() for char in col_type)  # Basic check for numeric types
-
-            summary[column] = {
-                "type": "numeric" if is_numeric else "categorical",
-                "data": values
-            }
-
-        cursor.close()
-        pool.release(conn)
+        for column, profile in profiles.items():
+            details = {k: v for k, v in profile.items() if k != 'top_values'}
+            summary[column] = {**details, "data": profile['top_values']}
 
         return jsonify({'summary': summary}), 200
 
@@ -295,25 +2513,170 @@ def table_summary():
         table_name = request.args.get('table_name')
         if not table_name:
             return jsonify({'error': 'Table name is required'}), 400
+        top_k = request.args.get('top_k', type=int) if 'top_k' in request.args else PROFILE_TOP_K
+        if top_k is None or top_k < 1:  # get(type=int) gives None for non-integers
+            return jsonify({'error': 'top_k must be a positive integer'}), 400
 
-        conn = pool.get_conn()
-        cursor = conn.cursor()
+        profiles = cached_result('profile', table_name, lambda: run_analysis(profile_table, table_name, top_k), top_k)
 
-        # Get column names
-        cursor.execute(f"DESCRIBE `{table_name}`;")
-        columns = [row['Field'] for row in cursor.fetchall()]
+        # Keep the value/count list the frontend pages through, capped at top_k
+        summary = {column: profile['top_values'] for column, profile in profiles.items()}
+        details = {
+            column: {k: v for k, v in profile.items() if k != 'top_values'}
+            for column, profile in profiles.items()
+        }
 
-        # Get summary data
-        summary = {}
-        for column in columns:
-            cursor.execute(f"SELECT `{column}`, COUNT(*) as count FROM `{table_name}` GROUP BY `{column}`;")
-            summary[column] = cursor.fetchall()
+        return jsonify({'summary': summary, 'profile': details}), 200
 
-        cursor.close()
-        pool.release(conn)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-        return jsonify({'summary': summary}), 200
 
+# Chart aggregation. Grouping runs in MySQL so only the points reach Python;
+# categories are capped to the top N plus an "Other" bucket and binned/time
+# series are thinned with LTTB, keeping payloads to a few kilobytes.
+AGGREGATE_MAX_POINTS = int(os.getenv("AGGREGATE_MAX_POINTS", 50))
+AGGREGATE_FUNCTIONS = {'count': 'COUNT', 'sum': 'SUM', 'avg': 'AVG', 'min': 'MIN', 'max': 'MAX'}
+TIME_BUCKETS = {
+    'minute': "DATE_FORMAT(`{0}`, '%%Y-%%m-%%d %%H:%%i:00')",
+    'hour': "DATE_FORMAT(`{0}`, '%%Y-%%m-%%d %%H:00:00')",
+    'day': "DATE_FORMAT(`{0}`, '%%Y-%%m-%%d')",
+    'week': "DATE_FORMAT(DATE_SUB(DATE(`{0}`), INTERVAL WEEKDAY(`{0}`) DAY), '%%Y-%%m-%%d')",
+    'month': "DATE_FORMAT(`{0}`, '%%Y-%%m-01')",
+    'year': "DATE_FORMAT(`{0}`, '%%Y-01-01')"
+}
+
+def lttb(x, y, threshold):
+    # Largest-Triangle-Three-Buckets: indices of the points that keep a series' shape
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    y = np.nan_to_num(y)
+    every = (n - 2) / (threshold - 2)
+    selected, a = [0], 0
+    for i in range(threshold - 2):
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        start, end = int(i * every) + 1, int((i + 1) * every) + 1
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected.append(a)
+    selected.append(n - 1)
+    return np.array(selected)
+
+def aggregate_table(table_name, group_by, measure, agg, bins, bucket, limit):
+    value_sql = f"{AGGREGATE_FUNCTIONS[agg]}({f'`{measure}`' if measure else '*'})"
+    result = {'group_by': group_by, 'measure': measure, 'agg': agg}
+
+    with pool.connection() as conn, conn.cursor() as cursor:
+        if bins or bucket:
+            # **Series**: numeric bins or time buckets, in order
+            if bins:
+                cursor.execute(f"SELECT MIN(`{group_by}`) AS low, MAX(`{group_by}`) AS high FROM `{table_name}`")
+                bounds = cursor.fetchone()
+                if bounds['low'] is None:
+                    return {**result, 'labels': [], 'values': [], 'counts': [], 'total_groups': 0, 'downsampled': False}
+                low, high = float(bounds['low']), float(bounds['high'])
+                width = (high - low) / bins or 1.0
+                key_sql = f"LEAST(FLOOR((`{group_by}` - %s) / %s), %s)"
+                params = (low, width, bins - 1)
+                result.update({'bin_width': width, 'bin_start': low})
+            else:
+                key_sql = TIME_BUCKETS[bucket].format(group_by)
+                params = ()
+            cursor.execute(
+                f"SELECT {key_sql} AS label, {value_sql} AS value, COUNT(*) AS n FROM `{table_name}` "
+                f"WHERE `{group_by}` IS NOT NULL GROUP BY label HAVING label IS NOT NULL ORDER BY label",
+                params
+            )
+            rows = cursor.fetchall()
+            labels = [low + int(row['label']) * width for row in rows] if bins else [row['label'] for row in rows]
+            values = np.array([float(row['value']) if row['value'] is not None else np.nan for row in rows])
+            x = np.array(labels, dtype=np.float64) if bins else pd.to_datetime(pd.Series(labels)).astype('int64').to_numpy(dtype=np.float64)
+            keep = lttb(x, values, limit)
+            return {
+                **result,
+                'labels': [labels[i] for i in keep],
+                'values': [None if np.isnan(values[i]) else values[i].item() for i in keep],
+                'counts': [int(rows[i]['n']) for i in keep],
+                'total_groups': len(rows),
+                'downsampled': len(keep) < len(rows)
+            }
+
+        # **Categories**: top N groups by value, everything else folded into "Other"
+        cursor.execute(
+            f"SELECT `{group_by}` AS label, {value_sql} AS value, COUNT(*) AS n FROM `{table_name}` "
+            f"GROUP BY `{group_by}` ORDER BY value DESC LIMIT %s",
+            (limit,)
+        )
+        rows = cursor.fetchall()
+        other = None
+        if len(rows) == limit:
+            top_filter = ' OR '.join([f"`{group_by}` <=> %s"] * len(rows))
+            cursor.execute(
+                f"SELECT {value_sql} AS value, COUNT(*) AS n, COUNT(DISTINCT `{group_by}`) AS groups "
+                f"FROM `{table_name}` WHERE NOT ({top_filter})",
+                [row['label'] for row in rows]
+            )
+            other = cursor.fetchone()
+            if not other['n']:
+                other = None
+
+    def native(value):
+        return float(value) if isinstance(value, Decimal) else to_native(value)
+
+    return {
+        **result,
+        'labels': [native(row['label']) for row in rows],
+        'values': [native(row['value']) for row in rows],
+        'counts': [int(row['n']) for row in rows],
+        'other': {'value': native(other['value']), 'count': int(other['n']), 'groups': int(other['groups'])} if other else None,
+        'total_groups': len(rows) + (int(other['groups']) if other else 0),
+        'downsampled': other is not None
+    }
+
+@app.route('/aggregate', methods=['GET'])
+def aggregate():
+    table_name = request.args.get('table_name')
+    group_by = request.args.get('group_by')
+    measure = request.args.get('measure') or None
+    agg = request.args.get('agg', 'count').lower()
+    bins = request.args.get('bins', type=int)
+    bucket = request.args.get('bucket')
+    limit = min(request.args.get('limit', AGGREGATE_MAX_POINTS, type=int), AGGREGATE_MAX_POINTS)
+
+    if not table_name or not group_by:
+        return jsonify({'error': 'table_name and group_by are required'}), 400
+    if agg not in AGGREGATE_FUNCTIONS:
+        return jsonify({'error': f"agg must be one of {', '.join(AGGREGATE_FUNCTIONS)}"}), 400
+    if agg != 'count' and not measure:
+        return jsonify({'error': f"'{agg}' needs a measure column"}), 400
+    if bins is not None and bins < 1 or bucket is not None and bucket not in TIME_BUCKETS:
+        return jsonify({'error': f"bins must be positive and bucket one of {', '.join(TIME_BUCKETS)}"}), 400
+    if bins and bucket:
+        return jsonify({'error': 'Use either bins or bucket, not both'}), 400
+    if limit < 3:
+        return jsonify({'error': 'limit must be at least 3'}), 400
+
+    try:
+        with pool.connection() as conn, conn.cursor() as cursor:
+            cursor.execute(f"DESCRIBE `{table_name}`;")
+            columns = {row['Field']: row['Type'].lower() for row in cursor.fetchall()}
+        unknown = [col for col in (group_by, measure) if col and col not in columns]
+        if unknown:
+            return jsonify({'error': f"Unknown columns: {', '.join(unknown)}"}), 400
+        if bins and not is_numeric_sql_type(columns[group_by]):
+            return jsonify({'error': f"bins needs a numeric column; '{group_by}' is {columns[group_by]}"}), 400
+        if bucket and not columns[group_by].startswith(('date', 'datetime', 'timestamp')):
+            return jsonify({'error': f"bucket needs a date or datetime column; '{group_by}' is {columns[group_by]}"}), 400
+
+        result = cached_result(
+            'aggregate', table_name,
+            lambda: aggregate_table(table_name, group_by, measure, agg, bins, bucket, limit),
+            group_by, measure, agg, bins, bucket, limit
+        )
+        return jsonify(result), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -330,24 +2693,16 @@ def login():
         return jsonify({"error": "Username and password are required"}), 400
 
     try:
-        conn = pool.get_conn()
-        cursor = conn.cursor()
-
         query = "SELECT id, username FROM users WHERE username = %s AND password = %s"
-        print(f"Executing query: {query} with params: {username}, {password}")
 
-        cursor.execute(query, (username, password))
-        print(f"Row count: {cursor.rowcount}")  # Print the row count
-        user = cursor.fetchone()
-        print(f"User: {user}")  # Print the user variable
-
-        cursor.close()
-        conn.close()
+        with pool.connection() as conn, conn.cursor() as cursor:
+            cursor.execute(query, (username, password))
+            user = cursor.fetchone()
 
         if user:
             session['user_id'] = user['id']
             session['username'] = user['username']
-            print(f"Session set for user: {session['username']}")  # Debug log
+            session['refreshed_at'] = time.time()
             return jsonify({"message": "Login successful", "user_id": user['id'], "username": user['username']}), 200
         else:
             return jsonify({"error": "Invalid credentials"}), 401
@@ -360,11 +2715,32 @@ def login():
 @app.route('/check_session', methods=['GET'])
 def check_session():
     if 'user_id' in session and 'username' in session:
-        session.modified = True  # Update the session object
+        # Polled often, so it only writes once the stored TTL is half used up
+        if time.time() - session.get('refreshed_at', 0) > SESSION_LIFETIME / 2:
+            session['refreshed_at'] = time.time()
         return jsonify({"user_id": session['user_id'], "username": session['username']}), 200
     return jsonify({"error": "Not authenticated"}), 401
 
 
+# Edits to a table are serialized with a MySQL named lock, which holds across
+# threads, worker processes and hosts alike, so each edit's previous version is
+# exactly the one the edit before it left behind.
+EDIT_LOCK_TIMEOUT = int(os.getenv("EDIT_LOCK_TIMEOUT", 30))  # Seconds an edit waits for the one before it
+
+@contextmanager
+def table_edit_lock(cursor, table_name):
+    name = 'edit:' + hashlib.sha1(table_name.encode()).hexdigest()  # Lock names are capped at 64 characters
+    cursor.execute("SELECT GET_LOCK(%s, %s) AS acquired", (name, EDIT_LOCK_TIMEOUT))
+    if not cursor.fetchone()['acquired']:
+        raise TimeoutError(f"Another edit of {table_name} is still running; try again")
+    try:
+        yield
+    finally:
+        try:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (name,))
+        except Exception:
+            pass  # A lost session releases its locks anyway
+
 @app.route('/update_record', methods=['POST'])
 def update_record():
     data = request.json
@@ -382,17 +2758,133 @@ def update_record():
 
     try:
         query = "UPDATE `{}` SET {} = %s WHERE id = %s".format(table_name, column_name)
-        conn = pool.get_conn()
-        cursor = conn.cursor()
-        cursor.execute(query, (new_value, record_id))
-        conn.commit()
+        select = f"SELECT * FROM `{table_name}` WHERE id = %s"
+        with pool.connection() as conn, conn.cursor() as cursor, table_edit_lock(cursor, table_name):
+            previous_version = table_version(table_name)
+            conn.begin()  # The connection autocommits; FOR UPDATE only locks inside a transaction
+            cursor.execute(select + " FOR UPDATE", (record_id,))
+            old_row = cursor.fetchone()
+            cursor.execute(query, (new_value, record_id))
+            cursor.execute(select, (record_id,))
+            new_row = cursor.fetchone()
+            conn.commit()
+            version = bump_table_version(table_name)
+            # Still under the lock, so this process's state takes edits in version order
+            carry_analysis_state(table_name, previous_version, version, old_row, new_row)
+        note_table_edit(table_name, version)
         return jsonify({"message": "Record updated successfully"}), 200
     except Exception as e:
         print(f"Error updating record: {e}")
         return jsonify({"error": str(e)}), 500
-    finally:
-        if 'conn' in locals():
-            pool.release(conn)
+
+
+# Bulk edits. Cell edits are grouped by column and each batch is one
+# UPDATE ... SET col = CASE id WHEN ... END WHERE id IN (...); a fill rule is
+# one UPDATE ... WHERE col IS NULL. Everything runs in a single transaction,
+# so a failing batch leaves the table as it was.
+BULK_UPDATE_BATCH_ROWS = int(os.getenv("BULK_UPDATE_BATCH_ROWS", 1000))
+BULK_UPDATE_MAX_EDITS = int(os.getenv("BULK_UPDATE_MAX_EDITS", 100000))
+FILL_STRATEGIES = ('mean', 'mode', 'value')
+
+def fill_value(cursor, table_name, column, strategy, value):
+    # Computed inside the transaction, so it reflects the edits applied before it
+    if strategy == 'value':
+        return value
+    if strategy == 'mean':
+        cursor.execute(f"SELECT AVG(`{column}`) AS value FROM `{table_name}`")
+    else:
+        cursor.execute(
+            f"SELECT `{column}` AS value, COUNT(*) AS n FROM `{table_name}` WHERE `{column}` IS NOT NULL "
+            f"GROUP BY `{column}` ORDER BY n DESC LIMIT 1"
+        )
+    row = cursor.fetchone()
+    return row['value'] if row else None
+
+@app.route('/bulk_update', methods=['POST'])
+def bulk_update():
+    data = request.json or {}
+    table_name = data.get('table_name')
+    edits = data.get('edits') or []  # [{record_id, column_name, new_value}]
+    fills = data.get('fills') or []  # [{column_name, strategy: mean | mode | value, value}]
+
+    if not table_name or not (edits or fills):
+        return jsonify({'error': 'table_name and at least one edit or fill are required'}), 400
+    if len(edits) > BULK_UPDATE_MAX_EDITS:
+        return jsonify({'error': f'At most {BULK_UPDATE_MAX_EDITS} edits per request'}), 400
+
+    # column -> {record_id: value}; a later edit of the same cell wins
+    by_column = {}
+    for edit in edits:
+        column_name, record_id = edit.get('column_name'), edit.get('record_id')
+        if not column_name or record_id in (None, ''):
+            return jsonify({'error': 'Each edit needs record_id and column_name'}), 400
+        new_value = edit.get('new_value')
+        by_column.setdefault(column_name, {})[record_id] = None if new_value == "" else new_value
+    for fill in fills:
+        if not fill.get('column_name') or fill.get('strategy') not in FILL_STRATEGIES:
+            return jsonify({'error': f"Each fill needs column_name and a strategy of {', '.join(FILL_STRATEGIES)}"}), 400
+
+    try:
+        with pool.connection() as conn, conn.cursor() as cursor:
+            cursor.execute(f"DESCRIBE `{table_name}`;")
+            types = {row['Field']: row['Type'] for row in cursor.fetchall()}
+        targets = list(by_column) + [fill['column_name'] for fill in fills]
+        unknown = [col for col in targets if col not in types or col == 'id']
+        if unknown:
+            return jsonify({'error': f"Unknown or read-only columns: {', '.join(unknown)}"}), 400
+        not_numeric = [fill['column_name'] for fill in fills if fill['strategy'] == 'mean' and not is_numeric_sql_type(types[fill['column_name']])]
+        if not_numeric:
+            return jsonify({'error': f"mean needs a numeric column: {', '.join(not_numeric)}"}), 400
+
+        started = time.perf_counter()
+        batches = []
+        # Same lock as /update_record, so single-cell edits never interleave with a bulk one
+        with pool.connection() as conn, conn.cursor() as cursor:
+            with table_edit_lock(cursor, table_name):
+                conn.begin()
+                for column_name, cells in by_column.items():
+                    cells = list(cells.items())
+                    for start in range(0, len(cells), BULK_UPDATE_BATCH_ROWS):
+                        batch = cells[start:start + BULK_UPDATE_BATCH_ROWS]
+                        batch_started = time.perf_counter()
+                        affected = cursor.execute(
+                            f"UPDATE `{table_name}` SET `{column_name}` = CASE id {' '.join(['WHEN %s THEN %s'] * len(batch))} END "
+                            f"WHERE id IN ({', '.join(['%s'] * len(batch))})",
+                            [param for cell in batch for param in cell] + [record_id for record_id, _ in batch]
+                        )
+                        batches.append({
+                            'column': column_name, 'kind': 'edits', 'rows': len(batch),
+                            'affected_rows': affected, 'seconds': round(time.perf_counter() - batch_started, 4)
+                        })
+                for fill in fills:
+                    batch_started = time.perf_counter()
+                    column_name = fill['column_name']
+                    value = fill_value(cursor, table_name, column_name, fill['strategy'], fill.get('value'))
+                    affected = 0
+                    if value is not None:
+                        affected = cursor.execute(f"UPDATE `{table_name}` SET `{column_name}` = %s WHERE `{column_name}` IS NULL", (value,))
+                    batches.append({
+                        'column': column_name, 'kind': 'fill', 'strategy': fill['strategy'], 'value': value,
+                        'affected_rows': affected, 'seconds': round(time.perf_counter() - batch_started, 4)
+                    })
+                commit_started = time.perf_counter()
+                conn.commit()
+                commit_seconds = time.perf_counter() - commit_started
+                version = bump_table_version(table_name)
+        # Too many rows to fold into the incremental state; the next analysis rebuilds it
+        forget_analysis_state(table_name)
+        note_table_edit(table_name, version)
+
+        return jsonify({
+            'message': 'Bulk update applied',
+            'affected_rows': sum(batch['affected_rows'] for batch in batches),
+            'batches': batches,
+            'commit_seconds': round(commit_seconds, 4),
+            'total_seconds': round(time.perf_counter() - started, 4)
+        }), 200
+    except Exception as e:
+        print(f"Error in bulk update: {e}")
+        return jsonify({'error': str(e)}), 500
 
 
             
@@ -411,31 +2903,21 @@ def get_tables():
     try:
         user_id = session.get('user_id')
         if not user_id:
-            print("User not authenticated")  # Debug log
             return jsonify({'error': 'User not authenticated'}), 401
 
-        conn = pool.get_conn()
-        cursor = conn.cursor()
-
         # Properly format the query string
-        print(f"Fetching tables for user_id: {user_id}")  # Debug log
         query = f"SHOW TABLES LIKE 'user_{user_id}_%'"
-        print(f"Executing query: {query}")  # Debug log
 
-        cursor.execute(query)
-        result = cursor.fetchall()
-        print(f"Query result: {result}")  # Debug log
+        with pool.connection() as conn, conn.cursor() as cursor:
+            cursor.execute(query)
+            result = cursor.fetchall()
 
         # Extract table names from the dictionary result
         if result:
             all_tables = [row[list(row.keys())[0]] for row in result]  # Accessing the first key in the dictionary
-            print(f"Tables found: {all_tables}")  # Debug log
         else:
             all_tables = []
 
-        cursor.close()
-        pool.release(conn)
-
         return jsonify({'tables': all_tables}), 200
     except Exception as e:
         print("Error:", str(e))  # Debug log
@@ -453,21 +2935,269 @@ def delete_table():
     # if not table_name.isidentifier():
     #     return jsonify({'error': 'Invalid table name'}), 400
 
-    conn = pool.get_conn()
     try:
-        with conn.cursor() as cursor:
+        with pool.connection() as conn, conn.cursor() as cursor:
             cursor.execute(f"DROP TABLE IF EXISTS `{table_name}`")  # Use backticks for safety
-        conn.commit()
+            conn.commit()
+        bump_table_version(table_name)
+        forget_analysis_state(table_name)
+        drop_anomaly_model(table_name)
+        drop_snapshot(table_name)
         return jsonify({'message': f'Table {table_name} deleted successfully'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        pool.release(conn)
 
 
 
 
 
+# Bulk ingest: the upload is read in chunks and each chunk is written with one
+# multi-row INSERT (pymysql rewrites executemany into batched VALUES lists).
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 10000))
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", 4))
+UPLOAD_JOB_TTL = int(os.getenv("UPLOAD_JOB_TTL", 3600))  # Seconds a finished job stays queryable
+
+def read_upload_chunks(file, file_ext, chunksize=UPLOAD_CHUNK_SIZE):
+    if file_ext == 'csv':
+        # Read as text so inference sees the file's own spelling (leading zeros, "NA" as a value)
+        return pd.read_csv(file, chunksize=chunksize, dtype=str, keep_default_na=False)
+    # XLSX cannot be streamed by pandas, so slice the sheet after reading it
+    df = pd.read_excel(file)
+    return (df.iloc[start:start + chunksize] for start in range(0, max(len(df), 1), chunksize))
+
+def sql_column_name(col):
+    return escape_string(str(col).replace(' ', '_'))
+
+# Column type inference for uploads. The first chunk picks each column's type;
+# later chunks can only widen it (INT < BIGINT < DOUBLE, DATE < DATETIME,
+# anything else falls back to VARCHAR/TEXT).
+NUMERIC_KINDS = ['int', 'bigint', 'double']
+TEMPORAL_KINDS = ['date', 'datetime']
+DATE_PATTERN = r'^\s*\d{1,4}[-/.]\d{1,2}[-/.]\d{1,4}([ T]\d{1,2}:\d{2}(:\d{2}(\.\d+)?)?)?\s*$'
+TYPED_TABLE_COMMENT = 'typed'  # Marks tables whose column types can be trusted by the analysis code
+UPLOAD_INDEX_MIN_ROWS = int(os.getenv("UPLOAD_INDEX_MIN_ROWS", 1000))
+UPLOAD_INDEX_MAX_RATIO = float(os.getenv("UPLOAD_INDEX_MAX_RATIO", 0.2))  # Distinct/total ratio that counts as low cardinality
+UPLOAD_MAX_INDEXES = int(os.getenv("UPLOAD_MAX_INDEXES", 8))
+TEXT_INDEX_PREFIX = 64
+
+def present_mask(series):
+    mask = series.notna()
+    if series.dtype == object:
+        mask &= series.astype(str).str.strip() != ''
+    return mask
+
+def infer_column_type(series):
+    values = series[present_mask(series)]
+    if values.empty:
+        return ('null', 0)
+    strings = values.astype(str)
+    length = int(strings.str.len().max())
+    if pd.api.types.is_bool_dtype(values):
+        return ('varchar', length)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        # XLSX date cells arrive already parsed
+        return ('datetime' if (values != values.dt.normalize()).any() else 'date', length)
+
+    numbers = pd.to_numeric(values, errors='coerce')
+    # Leading zeros (zip codes, account numbers) are data, keep them as text
+    if numbers.notna().all() and not (values.dtype == object and strings.str.match(r'^\s*-?0\d').any()):
+        if (numbers % 1 == 0).all():
+            biggest = numbers.abs().max()
+            kind = 'int' if biggest < 2 ** 31 else 'bigint' if biggest < 2 ** 63 else 'double'
+        else:
+            kind = 'double'
+        return (kind, length)
+
+    if values.dtype == object and strings.str.match(DATE_PATTERN).all():
+        # The format is guessed from the first value; values spelled differently
+        # (a date among datetimes, 1999/12/31 among ISO dates) are parsed one by one
+        failed = strings[pd.to_datetime(strings, errors='coerce').isna()]
+        if failed.empty or pd.to_datetime(failed, errors='coerce', format='mixed').notna().all():
+            return ('datetime' if strings.str.contains(':').any() else 'date', length)
+
+    return ('varchar', length)
+
+def merge_column_types(current, found):
+    (kind_a, length_a), (kind_b, length_b) = current, found
+    length = max(length_a, length_b)
+    if kind_a == 'null' or kind_a == kind_b:
+        return (kind_b, length)
+    if kind_b == 'null':
+        return (kind_a, length)
+    for family in (NUMERIC_KINDS, TEMPORAL_KINDS):
+        if kind_a in family and kind_b in family:
+            return (max(kind_a, kind_b, key=family.index), length)
+    return ('varchar', length)
+
+def sql_type(column_type):
+    kind, length = column_type
+    if kind in ('int', 'bigint', 'double', 'date', 'datetime'):
+        return kind.upper()
+    if length <= 255:
+        # Round up so small growth between chunks does not force an ALTER
+        return f"VARCHAR({min(255, max(32, 1 << (max(length, 1) - 1).bit_length()))})"
+    return 'TEXT' if length <= 65535 else 'MEDIUMTEXT'
+
+def to_sql_value(value, kind):
+    if kind in ('int', 'bigint'):
+        return int(Decimal(value.strip())) if isinstance(value, str) else int(value)
+    if kind == 'double':
+        return float(value)
+    if kind in TEMPORAL_KINDS:
+        stamp = pd.Timestamp(value)
+        return stamp.date() if kind == 'date' else stamp.to_pydatetime()
+    return value if isinstance(value, str) else str(value)
+
+def rows_for_insert(chunk, column_types):
+    columns = []
+    for col, (kind, _) in zip(chunk.columns, column_types):
+        series = chunk[col]
+        present = present_mask(series).tolist()
+        columns.append([to_sql_value(v, kind) if keep else None for v, keep in zip(series.tolist(), present)])
+    return list(zip(*columns))
+
+def create_upload_indexes(cursor, table_name, columns, total_rows):
+    # Secondary indexes on low-cardinality columns, found with one COUNT(DISTINCT) scan
+    if total_rows < UPLOAD_INDEX_MIN_ROWS:
+        return []
+    candidates = [name for name, (kind, _) in columns if kind not in ('double', 'null')]
+    if not candidates:
+        return []
+    cursor.execute(f"SELECT {', '.join(f'COUNT(DISTINCT `{name}`) AS `{name}`' for name in candidates)} FROM `{table_name}`;")
+    distinct = cursor.fetchone()
+    low_cardinality = sorted(
+        (name for name in candidates if distinct[name] <= UPLOAD_INDEX_MAX_RATIO * total_rows),
+        key=lambda name: distinct[name]
+    )[:UPLOAD_MAX_INDEXES]
+    for name in low_cardinality:
+        create_index(cursor, table_name, name, sql_type(dict(columns)[name]))
+    return low_cardinality
+
+def create_index(cursor, table_name, column, declared_type):
+    # TEXT columns can only be indexed on a prefix
+    prefix = f"({TEXT_INDEX_PREFIX})" if declared_type.lower().endswith('text') else ''
+    index_name = f"idx_{column}"[:64]
+    cursor.execute(f"CREATE INDEX `{index_name}` ON `{table_name}` (`{column}`{prefix});")
+
+def bulk_load(cursor, conn, table_name, chunks, on_chunk=None):
+    started = time.perf_counter()
+    total_rows = 0
+    chunk_count = 0
+    insert_query = None
+    column_types = None
+
+    try:
+        for chunk in chunks:
+            if insert_query is None:
+                column_names = [sql_column_name(col) for col in chunk.columns]
+                column_types = [infer_column_type(chunk[col]) for col in chunk.columns]
+                columns = [f"`{name}` {sql_type(col_type)} NULL" for name, col_type in zip(column_names, column_types)]
+                # Create the table with an 'id' column as the primary key
+                cursor.execute(f"""
+                    CREATE TABLE `{table_name}` (
+                        `id` INT AUTO_INCREMENT PRIMARY KEY,
+                        {', '.join(columns)}
+                    ) COMMENT='{TYPED_TABLE_COMMENT}';
+                """)
+                placeholders = ', '.join(['%s'] * len(column_names))
+                insert_query = f"INSERT INTO `{table_name}` ({', '.join(f'`{col}`' for col in column_names)}) VALUES ({placeholders})"
+                # One transaction for the whole file (a widening ALTER below commits implicitly)
+                conn.begin()
+            else:
+                for i, col in enumerate(chunk.columns):
+                    widened = merge_column_types(column_types[i], infer_column_type(chunk[col]))
+                    if sql_type(widened) != sql_type(column_types[i]):
+                        cursor.execute(f"ALTER TABLE `{table_name}` MODIFY `{column_names[i]}` {sql_type(widened)} NULL;")
+                        conn.begin()
+                    column_types[i] = widened
+
+            if chunk.empty:
+                continue
+            rows = rows_for_insert(chunk, column_types)
+            cursor.executemany(insert_query, rows)
+            total_rows += len(rows)
+            chunk_count += 1
+            if on_chunk:
+                on_chunk(total_rows)
+
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        # Only drop the table if this load created it
+        if insert_query is not None:
+            cursor.execute(f"DROP TABLE IF EXISTS `{table_name}`")
+        raise
+
+    return {
+        'rows': total_rows,
+        'chunks': chunk_count,
+        'elapsed': time.perf_counter() - started,
+        'columns': list(zip(column_names, column_types)) if column_types else []
+    }
+
+
+# Background upload jobs, keyed by job id. Each job is also written through to
+# analysis_cache, so /upload_status works from any worker when the cache is
+# shared (the disk backend) under a multi-process server.
+upload_executor = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix="upload")
+upload_jobs = {}
+upload_jobs_lock = threading.Lock()
+
+def update_upload_job(job_id, **fields):
+    with upload_jobs_lock:
+        upload_jobs[job_id].update(fields)
+        job = dict(upload_jobs[job_id])
+    analysis_cache.set(f"upload_job:{job_id}", job)
+
+def prune_upload_jobs():
+    cutoff = time.time() - UPLOAD_JOB_TTL
+    with upload_jobs_lock:
+        for job_id in [j for j, job in upload_jobs.items() if job['finished_at'] and job['finished_at'] < cutoff]:
+            del upload_jobs[job_id]
+
+def run_upload_job(job_id, path, file_ext, table_name):
+    update_upload_job(job_id, status='running', started_at=time.time())
+    loaded = False
+    try:
+        with open(path, 'rb') as handle:
+            chunks = read_upload_chunks(handle, file_ext)
+
+            def on_chunk(rows_inserted):
+                # pandas reads ahead from the handle, so its offset is what has been parsed so far
+                update_upload_job(job_id, rows_inserted=rows_inserted, bytes_parsed=handle.tell())
+
+            with pool.connection() as conn, conn.cursor() as cursor:
+                load_stats = bulk_load(cursor, conn, table_name, chunks, on_chunk=on_chunk)
+                loaded = True
+                update_upload_job(job_id, status='indexing', rows_inserted=load_stats['rows'], bytes_parsed=os.path.getsize(path))
+                try:
+                    indexes = create_upload_indexes(cursor, table_name, load_stats['columns'], load_stats['rows'])
+                except Exception:
+                    # The data is loaded; a failed index only costs filter speed
+                    print(traceback.format_exc())
+                    indexes = []
+
+        update_upload_job(
+            job_id,
+            status='done',
+            rows_inserted=load_stats['rows'],
+            chunks=load_stats['chunks'],
+            bytes_parsed=os.path.getsize(path),
+            column_types={name: sql_type(col_type) for name, col_type in load_stats['columns']},
+            indexes=indexes,
+            finished_at=time.time()
+        )
+    except Exception as e:
+        print(traceback.format_exc())
+        update_upload_job(job_id, status='error', error=str(e), finished_at=time.time())
+    finally:
+        bump_table_version(table_name)
+        forget_analysis_state(table_name)
+        if loaded:
+            schedule_snapshot(table_name)
+        os.remove(path)
+
+
 @app.route('/upload', methods=['POST'])
 def upload_file():
     try:
@@ -479,9 +3209,6 @@ def upload_file():
         if file_ext not in ['csv', 'xlsx']:
             return jsonify({'error': 'Only CSV and XLSX files are supported'}), 400
 
-        df = pd.read_csv(file) if file_ext == 'csv' else pd.read_excel(file)
-        df = df.fillna('')
-
         # Get user_id from session
         user_id = session.get('user_id')
         if not user_id:
@@ -490,39 +3217,38 @@ def upload_file():
         # Modify table name to include user_id
         table_name = f"user_{user_id}_{escape_string(file.filename.split('.')[0].replace(' ', '_'))}"
 
-        conn = pool.get_conn()
-        cursor = conn.cursor()
-
-        cursor.execute(f"SHOW TABLES LIKE '{table_name}'")
-        if cursor.fetchone():
-            cursor.close()
-            pool.release(conn)
+        with pool.connection() as conn, conn.cursor() as cursor:
+            cursor.execute(f"SHOW TABLES LIKE '{table_name}'")
+            exists = cursor.fetchone()
+        if exists:
             return jsonify({'error': f'Table {table_name} already exists'}), 400
 
-        # Escape column names with backticks
-        columns = [f"`{escape_string(col.replace(' ', '_'))}` TEXT" for col in df.columns.tolist()]
-        
-        # Create the table with an 'id' column as the primary key
-        create_table_query = f"""
-            CREATE TABLE `{table_name}` (
-                `id` INT AUTO_INCREMENT PRIMARY KEY,  -- Adding the 'id' column
-                {', '.join(columns)}
-            );
-        """
-        cursor.execute(create_table_query)
-
-        # Insert data into the table with escaped column names
-        for _, row in df.iterrows():
-            placeholders = ', '.join(['%s'] * len(row))
-            insert_query = f"INSERT INTO `{table_name}` ({', '.join([f'`{escape_string(col.replace(' ', '_'))}`' for col in df.columns])}) VALUES ({placeholders});"
-            cursor.execute(insert_query, tuple(row))
-
-        conn.commit()
-
-        cursor.close()
-        pool.release(conn)
+        # The request stream is gone once we return, so spool the file to disk for the worker
+        fd, path = tempfile.mkstemp(suffix=f".{file_ext}")
+        with os.fdopen(fd, 'wb') as spool:
+            file.save(spool)
+
+        prune_upload_jobs()
+        job_id = uuid.uuid4().hex
+        with upload_jobs_lock:
+            upload_jobs[job_id] = {
+                'job_id': job_id,
+                'user_id': user_id,
+                'table_name': table_name,
+                'status': 'queued',
+                'bytes_total': os.path.getsize(path),
+                'bytes_parsed': 0,
+                'rows_inserted': 0,
+                'chunks': 0,
+                'error': None,
+                'submitted_at': time.time(),
+                'started_at': None,
+                'finished_at': None
+            }
+        update_upload_job(job_id)  # Publish to the shared cache
+        upload_executor.submit(run_upload_job, job_id, path, file_ext, table_name)
 
-        return jsonify({'message': f'Table {table_name} created and data inserted successfully!'}), 200
+        return jsonify({'message': f'Upload of {table_name} started', 'job_id': job_id, 'table_name': table_name}), 202
 
     except Exception as e:
         error_trace = traceback.format_exc()
@@ -530,6 +3256,28 @@ def upload_file():
         return jsonify({'error': str(e), 'trace': error_trace}), 500
 
 
+@app.route('/upload_status/<job_id>', methods=['GET'])
+def upload_status(job_id):
+    with upload_jobs_lock:
+        job = dict(upload_jobs.get(job_id) or {})
+    if not job:
+        job = dict(analysis_cache.get(f"upload_job:{job_id}", track=False) or {})  # Started by another worker
+
+    if not job or job['user_id'] != session.get('user_id'):
+        return jsonify({'error': 'Upload job not found'}), 404
+
+    if job['started_at']:
+        elapsed = (job['finished_at'] or time.time()) - job['started_at']
+    else:
+        elapsed = 0
+    job['elapsed_seconds'] = round(elapsed, 3)
+    job['rows_per_second'] = round(job['rows_inserted'] / elapsed, 1) if elapsed > 0 else None
+    job['bytes_per_second'] = round(job['bytes_parsed'] / elapsed, 1) if elapsed > 0 else None
+    del job['user_id']
+
+    return jsonify(job), 200
+
+
 
 @app.route('/table_schema', methods=['GET'])
 def table_schema():
@@ -537,22 +3285,51 @@ def table_schema():
     if not table_name:
         return jsonify({'error': 'Table name is required'}), 400
 
-    conn = pool.get_conn()
-    cursor = conn.cursor()
-    
     try:
-        cursor.execute(f"DESCRIBE `{table_name}`;")
-        schema = [row['Field'] for row in cursor.fetchall()]
-
-        cursor.close()
-        pool.release(conn)
+        with pool.connection() as conn, conn.cursor() as cursor:
+            cursor.execute(f"DESCRIBE `{table_name}`;")
+            schema = [row['Field'] for row in cursor.fetchall()]
 
         return jsonify({'columns': schema}), 200
     except Exception as e:
-        cursor.close()
-        pool.release(conn)
         return jsonify({'error': str(e)}), 500
 
+# Columns that keep being filtered on get an index after FILTER_INDEX_AFTER uses
+FILTER_INDEX_AFTER = int(os.getenv("FILTER_INDEX_AFTER", 20))
+filter_uses = Counter()
+filter_uses_lock = threading.Lock()
+
+def note_filter_use(table_name, column):
+    with filter_uses_lock:
+        filter_uses[(table_name, column)] += 1
+        due = filter_uses[(table_name, column)] == FILTER_INDEX_AFTER
+    if due:
+        upload_executor.submit(ensure_filter_index, table_name, column)
+
+def ensure_filter_index(table_name, column):
+    try:
+        with pool.connection() as conn, conn.cursor() as cursor:
+            cursor.execute(f"SHOW INDEX FROM `{table_name}` WHERE Column_name = %s", (column,))
+            if cursor.fetchone():
+                return
+            cursor.execute(f"SHOW COLUMNS FROM `{table_name}` LIKE %s", (column,))
+            described = cursor.fetchone()
+            if described:
+                create_index(cursor, table_name, column, described['Type'])
+    except Exception:
+        print(traceback.format_exc())
+
+# Keyset pagination: cursors are opaque tokens wrapping the `id` of the first/last row on a page
+def encode_page_cursor(row_id):
+    return base64.urlsafe_b64encode(json.dumps({'id': row_id}).encode()).decode()
+
+def decode_page_cursor(token):
+    # Any malformed or tampered token raises ValueError (binascii and JSON errors already are)
+    try:
+        return int(json.loads(base64.urlsafe_b64decode(token.encode()))['id'])
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {e}") from e
+
 @app.route('/filter_data', methods=['POST'])
 def filter_data():
     try:
@@ -562,31 +3339,86 @@ def filter_data():
         page = int(data.get('page', 1))
         limit = int(data.get('limit', 10))
         offset = (page - 1) * limit
+        cursor_token = data.get('cursor')
+        direction = data.get('direction', 'next')
+        match = data.get('match', 'contains')  # 'prefix' can use an index on the column
 
         if not table_name:
             return jsonify({'error': 'Table name is required'}), 400
+        if direction not in ('next', 'prev') or match not in ('contains', 'prefix'):
+            return jsonify({'error': "direction must be 'next' or 'prev' and match 'contains' or 'prefix'"}), 400
 
-        conn = pool.get_conn()
-        cursor = conn.cursor()
+        # An emptied filter box means "no filter"; LIKE '%%' would also drop NULLs
+        filters = {col: val for col, val in filters.items() if val not in (None, '')}
+        for col in filters:
+            note_filter_use(table_name, escape_string(col))
 
         where_clause = " AND ".join([f"`{escape_string(col)}` LIKE %s" for col in filters.keys()]) if filters else "1=1"
-        values = [f"%{escape_string(val)}%" for val in filters.values()]
-
-        query = f"SELECT * FROM `{table_name}` WHERE {where_clause} LIMIT %s OFFSET %s"
-        cursor.execute(query, values + [limit, offset])
-        rows = cursor.fetchall()
-
-        count_query = f"SELECT COUNT(*) as total FROM `{table_name}` WHERE {where_clause}"
-        cursor.execute(count_query, values)
-        total_records = cursor.fetchone()["total"]
-
-        cursor.close()
-        pool.release(conn)
-
-        return jsonify({'data': rows, 'total_records': total_records}), 200
+        pattern = "{}%" if match == 'prefix' else "%{}%"
+        values = [pattern.format(escape_string(val)) for val in filters.values()]
+
+        with pool.connection() as conn, conn.cursor() as cursor:
+            if cursor_token:
+                # Seek from the cursor row instead of skipping OFFSET rows
+                comparison, order = ('>', 'ASC') if direction == 'next' else ('<', 'DESC')
+                query = f"SELECT * FROM `{table_name}` WHERE {where_clause} AND `id` {comparison} %s ORDER BY `id` {order} LIMIT %s"
+                cursor.execute(query, values + [decode_page_cursor(cursor_token), limit + 1])
+            else:
+                query = f"SELECT * FROM `{table_name}` WHERE {where_clause} ORDER BY `id` LIMIT %s OFFSET %s"
+                cursor.execute(query, values + [limit + 1, offset])
+            rows = list(cursor.fetchall())
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if cursor_token and direction == 'prev':
+            rows.reverse()
+
+        def count():
+            with pool.connection() as conn, conn.cursor() as cursor:
+                count_query = f"SELECT COUNT(*) as total FROM `{table_name}` WHERE {where_clause}"
+                cursor.execute(count_query, values)
+                return cursor.fetchone()["total"]
+
+        # Counted once per filter set and table version, not on every page
+        filters_key = hashlib.sha1(json.dumps([filters, match], sort_keys=True).encode()).hexdigest()
+        total_records = cached_result('filter_count', table_name, count, filters_key)
+
+        return jsonify({
+            'data': rows,
+            'total_records': total_records,
+            'has_more': has_more,
+            'next_cursor': encode_page_cursor(rows[-1]['id']) if rows else None,
+            'prev_cursor': encode_page_cursor(rows[0]['id']) if rows else None
+        }), 200
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/pool_metrics', methods=['GET'])
+def pool_metrics():
+    return jsonify(pool.metrics()), 200
+
+@app.route('/cache_metrics', methods=['GET'])
+def cache_metrics():
+    return jsonify(analysis_cache.metrics()), 200
+
+# Prometheus text exposition: request and span latency histograms plus the pool and cache counters
+METRICS_COUNTERS = {'created', 'destroyed', 'checkouts', 'timeouts', 'wait_seconds_total', 'hits', 'misses', 'evictions'}
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    lines = histogram_lines('http_request_duration_seconds', 'Request latency by endpoint.',
+                            request_histograms, ('method', 'endpoint', 'status'))
+    lines += histogram_lines('span_duration_seconds', 'Time spent per instrumented span.', span_histograms, ('span',))
+    for prefix, values in (('db_pool', pool.metrics()), ('analysis_cache', analysis_cache.metrics())):
+        for key, value in values.items():
+            if isinstance(value, (int, float)):
+                kind = 'counter' if key in METRICS_COUNTERS else 'gauge'
+                lines += [f"# TYPE {prefix}_{key} {kind}", f"{prefix}_{key} {value}"]
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+# Development server. Production: gunicorn -c gunicorn.conf.py app:app
 if __name__ == '__main__':
+    if not ANALYSIS_PROCESSES and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':  # The reloader's serving child
+        warm_pair_processes()
     app.run(debug=True)
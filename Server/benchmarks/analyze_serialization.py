@@ -0,0 +1,124 @@
+"""Compare the old row-by-row analyze_table report builder with build_analysis.
+
+Usage (from the Server directory):
+    python benchmarks/analyze_serialization.py --rows 500000 --null-ratio 0.2
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import IsolationForest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import build_analysis, cramers_v  # noqa: E402
+from itertools import combinations  # noqa: E402
+
+
+def make_frame(rows, null_ratio, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'id': np.arange(1, rows + 1),
+        'amount': rng.normal(100, 15, rows).round(2),
+        'quantity': rng.integers(0, 50, rows),
+        'score': rng.random(rows),
+        'city': rng.choice(['Lahore', 'Karachi', 'Islamabad', 'Quetta'], rows),
+        'status': rng.choice(['open', 'closed', 'pending'], rows),
+    }).astype(object)
+    for col in ['amount', 'quantity', 'city']:
+        df.loc[rng.random(rows) < null_ratio, col] = None
+    # Values arrive from MySQL as TEXT
+    return df.astype(str).where(df.notna(), None)
+
+
+def legacy_analysis(df):
+    # The implementation analyze_table used before build_analysis, minus the DB fetch
+    df = df.apply(pd.to_numeric, errors='ignore')
+    df = df.replace({None: np.nan, 'NULL': np.nan, '': np.nan})
+    insights, anomalies, missing_data_log = [], [], []
+    missing_data_rows = df[df.isnull().any(axis=1)]
+    missing_data = missing_data_rows.isnull().sum().to_dict()
+    for _, row in missing_data_rows.iterrows():
+        missing_data_log.append({**{k: (v if pd.notna(v) else None) for k, v in row.to_dict().items()},
+                                 'anomaly_reason': 'Missing data detected'})
+    duplicates = df[df.duplicated(keep=False)]
+    duplicate_count = duplicates.shape[0]
+    common_patterns = {col: df[col].mode()[0] if not df[col].mode().empty else None for col in df.columns}
+    numeric_cols = df.select_dtypes(include=['number']).columns
+    if not df.empty and len(numeric_cols) > 0:
+        iso_forest = IsolationForest(contamination=0.05)
+        df[numeric_cols] = df[numeric_cols].fillna(0)
+        anomaly_preds = iso_forest.fit_predict(df[numeric_cols])
+        anomalies += df[anomaly_preds == -1].apply(lambda row: {
+            **{k: (v if pd.notna(v) else None) for k, v in row.to_dict().items()},
+            'anomaly_reason': "Numeric outlier detected"}, axis=1).tolist()
+    for _, row in duplicates.iterrows():
+        anomalies.append({**{k: (v if pd.notna(v) else None) for k, v in row.to_dict().items()},
+                          'anomaly_reason': "Duplicate row detected"})
+    for _, row in missing_data_rows.iterrows():
+        anomalies.append({**{k: (v if pd.notna(v) else None) for k, v in row.to_dict().items()},
+                          'anomaly_reason': "Missing data detected"})
+    correlations = []
+    numerical_cols = df.select_dtypes(include=['number']).columns.tolist()
+    if numerical_cols:
+        numerical_corr = df[numerical_cols].corr(method='pearson')
+        correlations.append({'correlation_type': 'Numerical',
+                             'correlation_matrix': numerical_corr.where(pd.notna(numerical_corr), None).to_dict()})
+    for col1, col2 in combinations(df.select_dtypes(include=['object']).columns.tolist(), 2):
+        correlations.append({'correlation_type': 'Categorical', 'columns': (col1, col2),
+                             'correlation_score': cramers_v(df[col1], df[col2])})
+    for col in df.columns:
+        insights.append({'column': col, 'missing_values': missing_data.get(col, 0),
+                         'duplicates': duplicate_count, 'most_common': common_patterns.get(col, None)})
+
+    def convert_int64_to_int(obj):
+        if isinstance(obj, dict):
+            return {k: convert_int64_to_int(v) for k, v in obj.items()}
+        elif isinstance(obj, list):
+            return [convert_int64_to_int(v) for v in obj]
+        elif isinstance(obj, np.int64):
+            return int(obj)
+        elif isinstance(obj, float) and np.isnan(obj):
+            return None
+        return obj
+
+    return convert_int64_to_int({'insights': insights, 'correlations': correlations, 'anomalies': anomalies,
+                                 'duplicates': duplicates.to_dict(), 'logged_missing_data': missing_data_log})
+
+
+def measure(fn, df):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fn(df)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--null-ratio', type=float, default=0.2)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows, args.null_ratio)
+    legacy, legacy_time, legacy_mem = measure(legacy_analysis, df)
+    current, current_time, current_mem = measure(build_analysis, df)
+
+    # build_analysis lists anomalies as {label: (ids, count)}; the legacy report as row dicts
+    for reason in ['Missing data detected', 'Duplicate row detected']:
+        legacy_count = sum(1 for a in legacy['anomalies'] if a['anomaly_reason'] == reason)
+        assert legacy_count == current['anomalies'][reason][1], reason
+
+    print(f"rows={args.rows} null_ratio={args.null_ratio}")
+    print(f"legacy:  {legacy_time:8.2f}s  peak {legacy_mem:8.1f} MiB")
+    print(f"current: {current_time:8.2f}s  peak {current_mem:8.1f} MiB")
+    print(f"speedup: {legacy_time / current_time:8.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,325 @@
+"""Load-test the API endpoints and write comparable JSON results.
+
+Requests go through Flask's test client (no HTTP server), one client per
+worker thread, against either the MySQL configured in .env or a SQLite
+stand-in (benchmarks/sqlite_backend.py) behind the same pool interface.
+
+Usage (from the Server directory):
+    python benchmarks/api_load.py --backend sqlite --rows 200000 --clients 1,4,8 --output before.json
+    python benchmarks/api_load.py --backend sqlite --rows 200000 --clients 1,4,8 --output after.json --compare before.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+USER_ID = 1
+
+
+def make_dataset(rows, numeric, categorical, dates, text, null_ratio, duplicate_ratio, seed=0):
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for i in range(numeric):
+        columns[f'num_{i}'] = rng.normal(100 * (i + 1), 15, rows).round(2) if i % 2 == 0 else rng.integers(0, 1000, rows)
+    for i in range(categorical):
+        columns[f'cat_{i}'] = rng.choice([f'c{i}_{k}' for k in range(3 + 4 * i)], rows)
+    for i in range(dates):
+        columns[f'date_{i}'] = (pd.Timestamp('2015-01-01') + pd.to_timedelta(rng.integers(0, 3650, rows), unit='D')).strftime('%Y-%m-%d')
+    for i in range(text):
+        columns[f'text_{i}'] = [f'note {value:x}' for value in rng.integers(0, 2 ** 40, rows)]
+    df = pd.DataFrame(columns).astype(object)
+    for col in df.columns:
+        df.loc[rng.random(rows) < null_ratio, col] = None
+    if duplicate_ratio > 0:
+        copies = rng.choice(rows, int(rows * duplicate_ratio), replace=False)
+        df.iloc[copies[1:]] = df.iloc[copies[:-1]].to_numpy()
+    return df
+
+
+class RSSSampler:
+    """Peak resident set size over a window, sampled from /proc."""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = 0
+        self.running = False
+
+    @staticmethod
+    def current():
+        try:
+            with open('/proc/self/statm') as handle:
+                return int(handle.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except OSError:
+            # ru_maxrss is KiB on Linux, bytes on macOS; only a lifetime peak either way
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def __enter__(self):
+        self.peak, self.running = self.current(), True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        while self.running:
+            self.peak = max(self.peak, self.current())
+            time.sleep(self.interval)
+
+    def __exit__(self, *exc):
+        self.running = False
+        self.thread.join()
+        self.peak = max(self.peak, self.current())
+
+
+def percentiles(latencies):
+    values = np.array(latencies) * 1000
+    if not len(values):
+        return {}
+    return {
+        'p50': round(float(np.percentile(values, 50)), 3),
+        'p90': round(float(np.percentile(values, 90)), 3),
+        'p95': round(float(np.percentile(values, 95)), 3),
+        'p99': round(float(np.percentile(values, 99)), 3),
+        'max': round(float(values.max()), 3),
+        'mean': round(float(values.mean()), 3)
+    }
+
+
+def make_client(app_module):
+    client = app_module.app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = USER_ID
+    return client
+
+
+def run_scenario(app_module, name, request_fn, clients, requests_per_client, results):
+    """request_fn(client, rng) -> response; every client runs requests_per_client of them."""
+    pool_before = app_module.pool.metrics()
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def worker(index):
+        client, rng = make_client(app_module), random.Random(index)
+        for _ in range(requests_per_client):
+            started = time.perf_counter()
+            try:
+                response = request_fn(client, rng)
+                failed = response.status_code >= 400
+            except Exception as e:
+                response, failed = e, True
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if failed:
+                    errors.append(str(getattr(response, 'status_code', response)))
+
+    with RSSSampler() as rss:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as executor:
+            list(executor.map(worker, range(clients)))
+        wall = time.perf_counter() - started
+
+    pool_after = app_module.pool.metrics()
+    checkouts = pool_after['checkouts'] - pool_before['checkouts']
+    wait_total = pool_after['wait_seconds_total'] - pool_before['wait_seconds_total']
+    key = f"{name}@c{clients}"
+    results[key] = {
+        'scenario': name,
+        'clients': clients,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'error_samples': sorted(set(errors))[:5],
+        'latency_ms': percentiles(latencies),
+        'throughput_rps': round(len(latencies) / wall, 3) if wall else None,
+        'peak_rss_mb': round(rss.peak / 2 ** 20, 1),
+        'pool': {
+            'checkouts': checkouts,
+            'wait_ms_total': round(wait_total * 1000, 3),
+            'wait_ms_mean': round(wait_total * 1000 / checkouts, 3) if checkouts else 0.0,
+            'timeouts': pool_after['timeouts'] - pool_before['timeouts']
+        }
+    }
+    print(f"{key:32s} p50 {results[key]['latency_ms'].get('p50', 0):9.1f} ms  p95 {results[key]['latency_ms'].get('p95', 0):9.1f} ms  "
+          f"{results[key]['throughput_rps'] or 0:8.1f} req/s  errors {len(errors)}")
+
+
+def upload(client, df, name):
+    body = io.BytesIO(df.to_csv(index=False).encode())
+    response = client.post('/upload', data={'file': (body, f'{name}.csv')}, content_type='multipart/form-data')
+    if response.status_code != 202:
+        raise RuntimeError(f"upload failed: {response.status_code} {response.get_data(as_text=True)}")
+    job_id = response.get_json()['job_id']
+    while True:
+        status = client.get(f'/upload_status/{job_id}').get_json()
+        if status['status'] == 'error':
+            raise RuntimeError(f"upload failed: {status.get('error')}")
+        if status['status'] == 'done':
+            return status['table_name']
+        time.sleep(0.05)
+
+
+def compare(current, baseline_path, tolerance):
+    with open(baseline_path) as handle:
+        baseline = json.load(handle)['results']
+    regressions = []
+    print(f"\n{'scenario':32s} {'p95 before':>12s} {'p95 after':>12s} {'change':>8s}")
+    for key, result in current.items():
+        before = baseline.get(key, {}).get('latency_ms', {}).get('p95')
+        after = result['latency_ms'].get('p95')
+        if not before or after is None:
+            continue
+        change = after / before - 1
+        flag = '  REGRESSION' if change > tolerance else ''
+        print(f"{key:32s} {before:12.1f} {after:12.1f} {change:+8.1%}{flag}")
+        if flag:
+            regressions.append(key)
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=SERVER_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backend', choices=['sqlite', 'mysql'], default='sqlite')
+    parser.add_argument('--sqlite-path', help='SQLite file (default: a temporary file)')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--numeric', type=int, default=4)
+    parser.add_argument('--categorical', type=int, default=3)
+    parser.add_argument('--dates', type=int, default=1)
+    parser.add_argument('--text', type=int, default=1)
+    parser.add_argument('--null-ratio', type=float, default=0.05)
+    parser.add_argument('--duplicate-ratio', type=float, default=0.01)
+    parser.add_argument('--clients', default='1,4,8', help='Comma-separated concurrency levels')
+    parser.add_argument('--requests', type=int, default=20, help='Requests per client per scenario')
+    parser.add_argument('--cold-runs', type=int, default=3, help='Uncached analyze_table runs')
+    parser.add_argument('--pool-size', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', help='Earlier results file to diff p95 latencies against')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='p95 increase that counts as a regression')
+    args = parser.parse_args()
+
+    # Keep models, snapshots, sessions and cache out of the source tree
+    scratch = tempfile.mkdtemp(prefix='api_load_')
+    os.environ.setdefault('ANALYSIS_CACHE_BACKEND', 'memory')
+    os.environ['ANOMALY_MODEL_DIR'] = os.path.join(scratch, 'anomaly_models')
+    os.environ['SNAPSHOT_DIR'] = os.path.join(scratch, 'snapshots')
+    os.environ['SESSION_FILE_DIR'] = os.path.join(scratch, 'flask_session')
+    import app as app_module  # noqa: E402  (reads the environment at import)
+
+    if args.backend == 'sqlite':
+        from sqlite_backend import install
+        install(app_module, args.sqlite_path or os.path.join(scratch, 'bench.sqlite3'), size=args.pool_size)
+    elif args.pool_size:
+        app_module.pool = app_module.DatabasePool(size=args.pool_size)
+
+    df = make_dataset(args.rows, args.numeric, args.categorical, args.dates, args.text,
+                      args.null_ratio, args.duplicate_ratio, args.seed)
+    levels = [int(level) for level in args.clients.split(',')]
+    results = {}
+    client = make_client(app_module)
+
+    # **Upload**: one file per run, timed until the background job reports done
+    name = f"bench_{args.seed}_{int(time.time())}"
+    with RSSSampler() as rss:
+        started = time.perf_counter()
+        table_name = upload(client, df, name)
+        elapsed = time.perf_counter() - started
+    results['upload@c1'] = {
+        'scenario': 'upload', 'clients': 1, 'requests': 1, 'errors': 0,
+        'latency_ms': percentiles([elapsed]),
+        'throughput_rps': None,
+        'rows_per_second': round(args.rows / elapsed, 1),
+        'peak_rss_mb': round(rss.peak / 2 ** 20, 1)
+    }
+    print(f"{'upload@c1':32s} {elapsed:9.2f} s  {args.rows / elapsed:10.0f} rows/s")
+
+    numeric_cols = [col for col in df.columns if col.startswith('num_')]
+    categorical_cols = [col for col in df.columns if col.startswith('cat_')]
+    filter_values = {col: sorted(df[col].dropna().unique()) for col in categorical_cols}
+
+    # **analyze_table, cold**: the version is bumped first so nothing is served from cache
+    def analyze_cold(client, rng):
+        app_module.bump_table_version(table_name)
+        return client.get('/analyze_table', query_string={'table_name': table_name, 'mode': 'full'})
+
+    run_scenario(app_module, 'analyze_table_cold', analyze_cold, 1, args.cold_runs, results)
+
+    def analyze(client, rng):
+        return client.get('/analyze_table', query_string={'table_name': table_name, 'mode': 'full'})
+
+    def summary(client, rng):
+        return client.get('/table_summary', query_string={'table_name': table_name})
+
+    def filter_page(client, rng):
+        filters = {}
+        if categorical_cols:
+            col = rng.choice(categorical_cols)
+            if filter_values[col]:
+                filters[col] = rng.choice(filter_values[col])
+        return client.post('/filter_data', json={
+            'table_name': table_name, 'filters': filters, 'page': rng.randint(1, 5), 'limit': 10, 'match': 'prefix'
+        })
+
+    def update(client, rng):
+        col = rng.choice(numeric_cols or list(df.columns))
+        return client.post('/update_record', json={
+            'table_name': table_name, 'column_name': col,
+            'new_value': str(rng.randint(0, 1000)), 'record_id': rng.randint(1, args.rows)
+        })
+
+    # Read scenarios first; update_record invalidates their caches
+    for scenario, request_fn in [('analyze_table', analyze), ('table_summary', summary), ('filter_data', filter_page), ('update_record', update)]:
+        for clients in levels:
+            run_scenario(app_module, scenario, request_fn, clients, args.requests, results)
+
+    output = {
+        'meta': {
+            'commit': git_commit(),
+            'backend': args.backend,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'dataset': {
+                'rows': args.rows, 'numeric': args.numeric, 'categorical': args.categorical,
+                'dates': args.dates, 'text': args.text, 'null_ratio': args.null_ratio,
+                'duplicate_ratio': args.duplicate_ratio, 'seed': args.seed
+            },
+            'requests_per_client': args.requests,
+            'pool_size': app_module.pool.size
+        },
+        'results': results
+    }
+    with open(args.output, 'w') as handle:
+        json.dump(output, handle, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
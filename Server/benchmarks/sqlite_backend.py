@@ -0,0 +1,279 @@
+"""SQLite stand-in for MySQL behind the same pool interface as app.DatabasePool.
+
+Only the statements app.py issues are translated: backtick identifiers and
+%s placeholders, DESCRIBE / SHOW TABLES / SHOW COLUMNS / SHOW INDEX, the
+information_schema.TABLES lookups, AUTO_INCREMENT keys, table comments,
+ALTER ... MODIFY, prefix indexes and GET_LOCK / RELEASE_LOCK (named locks
+here span one process only). Good enough to benchmark the API
+without a MySQL server; not a general MySQL emulator.
+
+Usage:
+    import app
+    from sqlite_backend import install
+    install(app, '/tmp/bench.sqlite3')
+"""
+import math
+import multiprocessing
+import re
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pymysql
+
+for numpy_type in (np.int8, np.int16, np.int32, np.int64, np.uint8, np.uint16, np.uint32, np.uint64):
+    sqlite3.register_adapter(numpy_type, int)
+for numpy_type in (np.float32, np.float64):
+    sqlite3.register_adapter(numpy_type, float)
+sqlite3.register_adapter(np.bool_, bool)
+sqlite3.register_adapter(Decimal, float)
+sqlite3.register_adapter(pd.Timestamp, lambda value: value.isoformat(sep=' '))
+# DATE/DATETIME columns come back as date/datetime objects, as they do from pymysql
+sqlite3.register_converter('DATE', lambda value: date.fromisoformat(value.decode()[:10]))
+sqlite3.register_converter('DATETIME', lambda value: datetime.fromisoformat(value.decode()))
+
+CATALOG = """
+CREATE TABLE IF NOT EXISTS _catalog (
+    table_name TEXT NOT NULL,
+    column_name TEXT NOT NULL,  -- '' for the table itself
+    comment TEXT,
+    declared_type TEXT,
+    PRIMARY KEY (table_name, column_name)
+)
+"""
+
+DESCRIBE = re.compile(r"^\s*DESCRIBE\s+`([^`]+)`\s*;?\s*$", re.I)
+SHOW_COLUMNS = re.compile(r"^\s*SHOW\s+COLUMNS\s+FROM\s+`([^`]+)`\s+LIKE\s+%s\s*;?\s*$", re.I)
+SHOW_TABLES = re.compile(r"^\s*SHOW\s+TABLES(?:\s+LIKE\s+'([^']*)')?\s*;?\s*$", re.I)
+SHOW_INDEX = re.compile(r"^\s*SHOW\s+INDEX\s+FROM\s+`([^`]+)`\s+WHERE\s+Column_name\s*=\s*%s\s*;?\s*$", re.I)
+TABLE_INFO = re.compile(r"^\s*SELECT\s+(TABLE_\w+)\s+FROM\s+information_schema\.TABLES\b", re.I)
+CREATE_TABLE = re.compile(r"^\s*CREATE\s+TABLE\s+`([^`]+)`", re.I)
+ALTER_MODIFY = re.compile(r"^\s*ALTER\s+TABLE\s+`([^`]+)`\s+MODIFY\s+`([^`]+)`\s+(.+?)\s+NULL\s*;?\s*$", re.I)
+AUTO_INCREMENT = re.compile(r"(`\w+`)\s+INT\s+AUTO_INCREMENT\s+PRIMARY\s+KEY", re.I)
+TABLE_COMMENT = re.compile(r"\)\s*COMMENT\s*=\s*'([^']*)'\s*;?\s*$", re.I)
+PREFIX_INDEX = re.compile(r"(`[^`]+`)\(\d+\)")
+NAMED_LOCK = re.compile(r"^\s*SELECT\s+(GET_LOCK|RELEASE_LOCK)\(%s(?:,\s*%s)?\)(?:\s+AS\s+(\w+))?\s*;?\s*$", re.I)
+
+named_locks = {}
+named_locks_guard = threading.Lock()
+
+
+class SQLiteCursor:
+    def __init__(self, conn, as_dict):
+        self.conn = conn
+        self.as_dict = as_dict
+        self.cursor = conn.raw.cursor()
+        self.rows = None  # Rows of an emulated statement; None means read from self.cursor
+        self.description = None
+        self.rowcount = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.cursor.close()
+
+    def _emulated(self, columns, rows):
+        self.description = tuple((name, None, None, None, None, None, None) for name in columns)
+        self.rows = [tuple(row) for row in rows]
+        self.rowcount = len(self.rows)
+
+    def _describe(self, table_name, like=None):
+        overrides = dict(self.conn.raw.execute(
+            "SELECT column_name, declared_type FROM _catalog WHERE table_name = ? AND column_name != ''", (table_name,)
+        ).fetchall())
+        rows = []
+        for _, name, col_type, notnull, default, pk in self.conn.raw.execute(f"PRAGMA table_info(`{table_name}`)"):
+            if like is not None and name != like:
+                continue
+            col_type = overrides.get(name, col_type).lower()
+            rows.append((name, 'int' if col_type == 'integer' else col_type, 'NO' if notnull or pk else 'YES',
+                         'PRI' if pk else '', default, 'auto_increment' if pk else ''))
+        self._emulated(['Field', 'Type', 'Null', 'Key', 'Default', 'Extra'], rows)
+
+    def execute(self, query, args=None):
+        self.rows, self.rowcount = None, -1
+        raw = self.conn.raw
+
+        match = DESCRIBE.match(query)
+        if match:
+            return self._describe(match.group(1))
+        match = SHOW_COLUMNS.match(query)
+        if match:
+            return self._describe(match.group(1), like=args[0])
+        match = SHOW_TABLES.match(query)
+        if match:
+            pattern = match.group(1) or '%'
+            names = raw.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE ? AND name NOT LIKE '\\_%' ESCAPE '\\' "
+                "AND name NOT LIKE 'sqlite\\_%' ESCAPE '\\' ORDER BY name", (pattern,)
+            ).fetchall()
+            return self._emulated(['Tables_in_database'], names)
+        match = SHOW_INDEX.match(query)
+        if match:
+            table_name, rows = match.group(1), []
+            for _, index_name, unique, *_ in raw.execute(f"PRAGMA index_list(`{table_name}`)").fetchall():
+                for seq, _, column in raw.execute(f"PRAGMA index_info(`{index_name}`)").fetchall():
+                    if column == args[0]:
+                        rows.append((table_name, 0 if unique else 1, index_name, seq + 1, column))
+            return self._emulated(['Table', 'Non_unique', 'Key_name', 'Seq_in_index', 'Column_name'], rows)
+        match = TABLE_INFO.match(query)
+        if match:
+            field, table_name = match.group(1).upper(), args[0]
+            exists = raw.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)).fetchone()
+            if not exists:
+                return self._emulated([field], [])
+            if field == 'TABLE_ROWS':
+                value = raw.execute(f"SELECT COUNT(*) FROM `{table_name}`").fetchone()[0]
+            else:
+                row = raw.execute("SELECT comment FROM _catalog WHERE table_name = ? AND column_name = ''", (table_name,)).fetchone()
+                value = row[0] if row else ''
+            return self._emulated([field], [(value,)])
+        match = NAMED_LOCK.match(query)
+        if match:
+            function, alias = match.group(1).upper(), match.group(2) or match.group(1)
+            with named_locks_guard:
+                lock = named_locks.setdefault(args[0], threading.Lock())
+            if function == 'GET_LOCK':
+                acquired = lock.acquire(timeout=args[1] if args[1] >= 0 else -1)
+                if acquired:
+                    self.conn.held.add(args[0])
+                return self._emulated([alias], [(int(acquired),)])
+            released = args[0] in self.conn.held
+            if released:
+                self.conn.held.discard(args[0])
+                lock.release()
+            return self._emulated([alias], [(int(released),)])
+        match = ALTER_MODIFY.match(query)
+        if match:
+            # SQLite columns take any value; only DESCRIBE needs to see the new type.
+            # MySQL commits around DDL, so do the same.
+            self.conn.commit()
+            raw.execute("INSERT OR REPLACE INTO _catalog (table_name, column_name, declared_type) VALUES (?, ?, ?)", match.groups())
+            return self._emulated([], [])
+
+        comment = None
+        match = CREATE_TABLE.match(query)
+        if match:
+            query = AUTO_INCREMENT.sub(r"\1 INTEGER PRIMARY KEY AUTOINCREMENT", query)
+            comment_match = TABLE_COMMENT.search(query)
+            if comment_match:
+                comment = comment_match.group(1)
+                query = query[:comment_match.start()] + ')'
+        query = PREFIX_INDEX.sub(r"\1", query)
+        query = re.sub(r"\s+FOR\s+UPDATE\s*$", "", query, flags=re.I).replace('<=>', ' IS ')
+        if args is not None:
+            # pymysql only %-formats when arguments are given
+            query = query.replace('%s', '?').replace('%%', '%')
+
+        self.cursor.execute(query, tuple(args) if args is not None else ())
+        self.description = self.cursor.description
+        self.rowcount = self.cursor.rowcount
+        if comment is not None:
+            raw.execute("INSERT OR REPLACE INTO _catalog (table_name, column_name, comment) VALUES (?, '', ?)", (match.group(1), comment))
+        if re.match(r"^\s*DROP\s+TABLE", query, re.I):
+            table_name = re.search(r"`([^`]+)`", query).group(1)
+            raw.execute("DELETE FROM _catalog WHERE table_name = ?", (table_name,))
+        return self.rowcount
+
+    def executemany(self, query, rows):
+        query = query.replace('%s', '?').replace('%%', '%')
+        self.cursor.executemany(query, [tuple(row) for row in rows])
+        self.rowcount = self.cursor.rowcount
+        return self.rowcount
+
+    def _shape(self, row):
+        if row is None or not self.as_dict:
+            return row
+        return dict(zip((column[0] for column in self.description), row))
+
+    def _take(self, size=None):
+        if self.rows is not None:
+            taken = self.rows if size is None else self.rows[:size]
+            self.rows = [] if size is None else self.rows[size:]
+            return taken
+        return self.cursor.fetchall() if size is None else self.cursor.fetchmany(size)
+
+    def fetchone(self):
+        rows = self._take(1)
+        return self._shape(rows[0]) if rows else None
+
+    def fetchmany(self, size):
+        return [self._shape(row) for row in self._take(size)]
+
+    def fetchall(self):
+        return [self._shape(row) for row in self._take()]
+
+
+class SQLiteConnection:
+    """The subset of pymysql.Connection app.py uses."""
+
+    def __init__(self, path):
+        # Autocommit like DB_CONFIG; begin() opens explicit transactions
+        self.raw = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=60,
+                                   detect_types=sqlite3.PARSE_DECLTYPES)
+        self.raw.execute("PRAGMA journal_mode=WAL")
+        self.raw.execute("PRAGMA synchronous=NORMAL")
+        self.raw.execute(CATALOG)
+        self.raw.create_function('FLOOR', 1, lambda value: None if value is None else math.floor(value), deterministic=True)
+        self.raw.create_function('LEAST', -1, lambda *values: None if None in values else min(values), deterministic=True)
+        self.open = True
+        self.held = set()  # Named locks this session holds
+
+    def cursor(self, cursorclass=None):
+        return SQLiteCursor(self, as_dict=cursorclass is None or issubclass(cursorclass, pymysql.cursors.DictCursor))
+
+    def begin(self):
+        if not self.raw.in_transaction:
+            self.raw.execute("BEGIN")
+
+    def commit(self):
+        if self.raw.in_transaction:
+            self.raw.execute("COMMIT")
+
+    def rollback(self):
+        if self.raw.in_transaction:
+            self.raw.execute("ROLLBACK")
+
+    def ping(self, reconnect=False):
+        self.raw.execute("SELECT 1")
+
+    def close(self):
+        self.raw.close()
+        self.open = False
+        for name in self.held:  # Ending a MySQL session releases its named locks
+            named_locks[name].release()
+        self.held.clear()
+
+
+def init_analysis_worker(path, size):
+    import app as app_module  # Spawned processes import the app afresh, with the MySQL pool
+    app_module.init_analysis_worker()
+    install(app_module, path, size)
+
+
+def install(app_module, path, size=None):
+    """Replace app_module.pool with a DatabasePool whose connections are SQLite,
+    including the pools of its analysis processes when ANALYSIS_PROCESSES is set."""
+
+    class SQLitePool(app_module.DatabasePool):
+        def _open(self):
+            conn = SQLiteConnection(path)
+            with self.lock:
+                self.stats['created'] += 1
+            return conn
+
+    app_module.pool = SQLitePool(size=size or app_module.POOL_SIZE)
+    if app_module.ANALYSIS_PROCESSES and not app_module.analysis_worker:
+        app_module.analysis_process_pool = ProcessPoolExecutor(
+            max_workers=app_module.ANALYSIS_PROCESSES, mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_analysis_worker, initargs=(path, size)
+        )
+    return app_module.pool
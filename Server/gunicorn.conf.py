@@ -0,0 +1,41 @@
+# Production server: gunicorn -c gunicorn.conf.py app:app
+#
+# Pre-forked worker processes, each serving requests on a thread pool
+# (gthread) or on greenlets (WEB_WORKER_CLASS=gevent, needs gevent). The app
+# is imported once in the master and forked; database connections are opened
+# lazily inside each worker, and CPU-heavy analysis goes to a per-worker pool
+# of ANALYSIS_PROCESSES spawned processes.
+import os
+
+bind = os.getenv("WEB_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_WORKERS", max(2, (os.cpu_count() or 1))))
+worker_class = os.getenv("WEB_WORKER_CLASS", "gthread")  # gthread | gevent
+threads = int(os.getenv("WEB_THREADS", 8))  # Per worker, for gthread
+worker_connections = int(os.getenv("WEB_WORKER_CONNECTIONS", 200))  # Per worker, for gevent
+timeout = int(os.getenv("WEB_TIMEOUT", 300))  # Full analyses of large tables can take minutes
+graceful_timeout = 30
+keepalive = 5
+preload_app = True  # Import once; workers fork with no open connections
+accesslog = os.getenv("WEB_ACCESS_LOG", "-")
+
+# Workers only share what lives outside their process, so default the
+# per-process stores to shared ones. SESSION_BACKEND=redis is needed when
+# workers run on more than one host.
+if workers > 1:
+    os.environ.setdefault("ANALYSIS_CACHE_BACKEND", "disk")
+    os.environ.setdefault("SESSION_BACKEND", "filesystem")
+os.environ.setdefault("ANALYSIS_PROCESSES", str(max(1, (os.cpu_count() or 1) // workers)))
+
+
+def on_starting(server):
+    for name, shared in (("ANALYSIS_CACHE_BACKEND", "disk"), ("SESSION_BACKEND", "filesystem or redis")):
+        if workers > 1 and os.environ.get(name) == "memory":
+            server.log.warning("%s=memory is per worker; with %d workers use %s", name, workers, shared)
+
+
+def post_fork(server, worker):
+    # Analysis runs on this worker's threads unless ANALYSIS_PROCESSES hands it
+    # to processes, which warm their own Cramér's V pool when they start
+    import app
+    if not app.ANALYSIS_PROCESSES:
+        app.warm_pair_processes()
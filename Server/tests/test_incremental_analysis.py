@@ -0,0 +1,171 @@
+"""The report carried through /update_record edits must match a full recompute.
+
+Runs against the SQLite stand-in from benchmarks/, so no MySQL server is needed.
+"""
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pytest
+
+SCRATCH = tempfile.mkdtemp(prefix='incremental-analysis-')
+os.environ.update(
+    ANALYSIS_CACHE_BACKEND='memory',
+    ANALYSIS_PROCESSES='0',
+    ANOMALY_MODEL_DIR=os.path.join(SCRATCH, 'models'),
+    SNAPSHOT_DIR=os.path.join(SCRATCH, 'snapshots'),
+)
+SERVER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [SERVER, os.path.join(SERVER, 'benchmarks')]
+
+import app as server  # noqa: E402
+from api_load import make_dataset, upload  # noqa: E402
+from sqlite_backend import install  # noqa: E402
+
+install(server, os.path.join(SCRATCH, 'db.sqlite3'))
+
+EDITS = [
+    ('num_0', '400', 5),
+    ('num_1', '', 12),               # Becomes missing
+    ('cat_0', 'c0_2', 40),
+    ('cat_1', 'c1_new', 41),         # A value the codes haven't seen
+    ('date_0', '1850-06-01', 77),    # Unrealistic date
+    ('num_0', '100', 5),             # Same row edited twice
+    ('num_2', '0', 30),              # Zero sits with the NaN-filled rows, far from the rest
+]
+
+
+@pytest.fixture(scope='module')
+def client():
+    client = server.app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'], session['username'] = 1, 'tests'
+    return client
+
+
+@pytest.fixture(scope='module')
+def table(client):
+    table_name = upload(client, make_dataset(3000, 3, 2, 1, 0, 0.02, 0.0, seed=1), 'incremental')
+    server.snapshot_executor.submit(lambda: None).result()  # Let the upload's snapshot land first
+    return table_name
+
+
+@pytest.fixture(scope='module')
+def legacy_table():
+    # A table from before typed uploads: every column TEXT and no typed-schema
+    # comment, so analysis infers the kinds from the values
+    rng = np.random.default_rng(2)
+    rows = [(f"{x:.2f}", str(int(y)), f"c{c}") for x, y, c in
+            zip(rng.normal(10, 2, 2000), rng.integers(0, 100, 2000), rng.integers(0, 5, 2000))]
+    with server.pool.connection() as conn, conn.cursor() as cursor:
+        cursor.execute("CREATE TABLE `legacy` (`id` INT AUTO_INCREMENT PRIMARY KEY, `x` TEXT, `y` TEXT, `c` TEXT)")
+        cursor.executemany("INSERT INTO `legacy` (`x`, `y`, `c`) VALUES (%s, %s, %s)", rows)
+        conn.commit()
+    return 'legacy'
+
+
+def full_report(table_name):
+    key = result_key(table_name)
+    return server.paged_report(table_name, key, server.build_streamed_analysis(table_name, server.ANALYZE_FIT_ROWS, None))
+
+
+def result_key(table_name):
+    return server.result_key('analyze_table', table_name, server.table_version(table_name), 'full', None)
+
+
+def comparable(report):
+    numeric = next(entry for entry in report['correlations'] if entry['correlation_type'] == 'Numerical')
+    categorical = {tuple(entry['columns']): entry['correlation_score'] for entry in report['correlations']
+                   if entry['correlation_type'] == 'Categorical'}
+    return {
+        'insights': report['insights'],
+        'missing_data': report['missing_data'],
+        'summary': [(entry['reason'], entry['count'], entry['next_cursor']) for entry in report['anomaly_summary']],
+        'anomalies': report['anomalies'],
+        'duplicates': report['duplicates'],
+        'ids': {reason: entry['ids'].tolist() for reason, entry in report['anomaly_ids']['reasons'].items()},
+        'numeric': numeric['correlation_matrix'],
+        'categorical': categorical,
+    }
+
+
+def assert_matches_full_recompute(table_name):
+    incremental = comparable(server.analysis_cache.get(result_key(table_name)))
+    recomputed = comparable(full_report(table_name))
+
+    numeric, recomputed_numeric = incremental.pop('numeric'), recomputed.pop('numeric')
+    categorical, recomputed_categorical = incremental.pop('categorical'), recomputed.pop('categorical')
+    assert incremental == recomputed
+    for col, row in recomputed_numeric.items():
+        assert numeric[col] == pytest.approx(row, rel=1e-9, abs=1e-12, nan_ok=True)
+    assert categorical == pytest.approx(recomputed_categorical, rel=1e-9, nan_ok=True)
+    return incremental
+
+
+def test_incremental_report_matches_full_recompute(client, table):
+    response = client.get('/analyze_table', query_string={'table_name': table, 'mode': 'full'})
+    assert response.status_code == 200
+    assert table in server.analysis_states
+
+    for column, value, record_id in EDITS:
+        response = client.post('/update_record', json={
+            'table_name': table, 'column_name': column, 'new_value': value, 'record_id': record_id
+        })
+        assert response.status_code == 200
+
+    response = client.get('/analyze_table', query_string={'table_name': table, 'mode': 'full'})
+    assert response.status_code == 200
+    assert 'incremental_report' in response.get_json()['stage_timings']
+    incremental = assert_matches_full_recompute(table)
+    assert any(reason.startswith('date:') for reason in incremental['ids'])
+
+
+def test_edit_does_not_build_a_report(client, table):
+    client.get('/analyze_table', query_string={'table_name': table, 'mode': 'full'})
+    response = client.post('/update_record', json={
+        'table_name': table, 'column_name': 'num_2', 'new_value': '123.45', 'record_id': 9
+    })
+    assert response.status_code == 200
+    assert server.analysis_cache.get(result_key(table), track=False) is None
+    assert server.analysis_states[table].version == server.table_version(table)
+
+
+def test_hash_groups_follow_edits(client, table):
+    client.get('/analyze_table', query_string={'table_name': table, 'mode': 'full'})
+    for record_id in (20, 21):
+        client.post('/update_record', json={'table_name': table, 'column_name': 'cat_0', 'new_value': 'c0_edited', 'record_id': record_id})
+    state = server.analysis_states[table]
+    for position in (state.position(20), state.position(21), 0, 1500):
+        row_hash = state.hashes[position]
+        assert state.hash_group(row_hash).tolist() == np.flatnonzero(state.hashes == row_hash).tolist()
+
+
+def test_edit_that_changes_an_inferred_kind_drops_the_state(client, legacy_table):
+    def edit(column, value, record_id):
+        response = client.post('/update_record', json={
+            'table_name': legacy_table, 'column_name': column, 'new_value': value, 'record_id': record_id
+        })
+        assert response.status_code == 200
+
+    def analyze():
+        response = client.get('/analyze_table', query_string={'table_name': legacy_table, 'mode': 'full'})
+        assert response.status_code == 200
+        return response.get_json()['stage_timings']
+
+    analyze()
+    assert server.analysis_states[legacy_table].kinds['x'] == 'numeric'
+
+    edit('y', '42', 3)  # Still numeric: carried
+    assert 'incremental_report' in analyze()
+    assert_matches_full_recompute(legacy_table)
+
+    edit('x', 'abc', 3)  # x stops being numeric
+    assert legacy_table not in server.analysis_states
+    assert 'incremental_report' not in analyze()
+    assert server.analysis_states[legacy_table].kinds['x'] == 'object'
+
+    edit('x', '8.58', 3)  # The only non-numeric value is gone: numeric again
+    assert legacy_table not in server.analysis_states
+    analyze()
+    assert server.analysis_states[legacy_table].kinds['x'] == 'numeric'
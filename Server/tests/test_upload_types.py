@@ -0,0 +1,88 @@
+"""Column type inference and chunk-to-chunk widening for typed uploads."""
+import os
+import sys
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import infer_column_type, merge_column_types, sql_type  # noqa: E402
+
+
+def csv_column(*values):
+    # CSV chunks are read with dtype=str and keep_default_na=False
+    return pd.Series(values, dtype=object)
+
+
+def kind(series):
+    return infer_column_type(series)[0]
+
+
+@pytest.mark.parametrize('values, expected', [
+    (('1', '2', '-3'), 'int'),
+    (('0', '10', '7'), 'int'),                          # A lone zero is a number
+    (('1.5', '2', ''), 'double'),                       # Blanks don't count
+    (('3000000000', '1'), 'bigint'),
+    (('1e20', '1'), 'double'),                          # Beyond BIGINT
+    (('00501', '10001'), 'varchar'),                    # Zip codes keep their zeros
+    (('-007', '12'), 'varchar'),
+    (('2023-01-05', '1999/12/31'), 'date'),
+    (('2023-01-05 10:30', '2023-01-06'), 'datetime'),
+    (('2023-02-30', '2023-01-05'), 'varchar'),          # Looks like a date, isn't one
+    (('NA', '1'), 'varchar'),                           # "NA" is a value, not a missing marker
+    (('', '  '), 'null'),
+])
+def test_csv_text_inference(values, expected):
+    assert kind(csv_column(*values)) == expected
+
+
+def test_length_is_the_longest_present_value():
+    assert infer_column_type(csv_column('a', 'abcd', '')) == ('varchar', 4)
+
+
+def test_xlsx_cells_arrive_typed():
+    dates = pd.Series(pd.to_datetime(['2023-01-05', '2023-01-06']))
+    stamps = pd.Series(pd.to_datetime(['2023-01-05', '2023-01-06 08:15'], format='ISO8601'))
+    assert kind(dates) == 'date'
+    assert kind(stamps) == 'datetime'
+    assert kind(pd.Series([1, 2, np.nan])) == 'int'
+    assert kind(pd.Series([1.25, 2.0])) == 'double'
+    assert kind(pd.Series([True, False])) == 'varchar'
+
+
+@pytest.mark.parametrize('chunks, expected', [
+    ([('1',), ('3000000000',)], 'bigint'),
+    ([('1',), ('3000000000',), ('0.5',)], 'double'),
+    ([('0.5',), ('1',)], 'double'),                     # Never narrows back
+    ([('',), ('12',)], 'int'),                          # An all-blank chunk settles nothing
+    ([('12',), ('',)], 'int'),
+    ([('2023-01-05',), ('2023-01-05 10:30',)], 'datetime'),
+    ([('2023-01-05',), ('12',)], 'varchar'),            # Date then number: text
+    ([('2023-01-05',), ('soon',)], 'varchar'),
+    ([('12',), ('00501',)], 'varchar'),
+])
+def test_chunks_only_widen(chunks, expected):
+    merged = reduce(merge_column_types, (infer_column_type(csv_column(*chunk)) for chunk in chunks), ('null', 0))
+    assert merged[0] == expected
+
+
+def test_merged_length_is_the_widest():
+    assert merge_column_types(('varchar', 10), ('int', 3)) == ('varchar', 10)
+    assert merge_column_types(('int', 3), ('varchar', 40)) == ('varchar', 40)
+
+
+@pytest.mark.parametrize('column_type, expected', [
+    (('int', 5), 'INT'),
+    (('datetime', 19), 'DATETIME'),
+    (('varchar', 3), 'VARCHAR(32)'),
+    (('varchar', 100), 'VARCHAR(128)'),
+    (('varchar', 255), 'VARCHAR(255)'),
+    (('varchar', 256), 'TEXT'),
+    (('varchar', 70000), 'MEDIUMTEXT'),
+    (('null', 0), 'VARCHAR(32)'),
+])
+def test_sql_type(column_type, expected):
+    assert sql_type(column_type) == expected
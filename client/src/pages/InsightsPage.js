@@ -11,6 +11,8 @@ const InsightsPage = () => {
   const [insights, setInsights] = useState([]);
   const [correlations, setCorrelations] = useState([]);
   const [anomalies, setAnomalies] = useState([]);
+  const [anomalySummary, setAnomalySummary] = useState([]);
+  const [anomalyListing, setAnomalyListing] = useState(null);
   const [user, setUser] = useState(null);
   const [pageCount, setPageCount] = useState(0);
   const [currentPage, setCurrentPage] = useState(0);
@@ -67,6 +69,8 @@ const fetchTables = async () => {
       setInsights([...data.insights || []]);
       setCorrelations([...data.correlations || []]);
       setAnomalies([...data.anomalies || []]);
+      setAnomalySummary([...data.anomaly_summary || []]);
+      setAnomalyListing(data.anomaly_listing || null);
   
       // Calculate total pages based on the number of insights
       setPageCount(Math.ceil((data.insights?.length || 0) / 10));
@@ -85,6 +89,23 @@ const fetchTables = async () => {
   };
   
 
+  // Next page of one anomaly reason; the analysis only returns the first page inline
+  const loadMoreAnomalies = async (reason) => {
+    const entry = anomalySummary.find((item) => item.reason === reason);
+    if (!entry || !entry.next_cursor) return;
+    try {
+      const res = await axios.get('http://localhost:5000/anomaly_rows', {
+        params: { listing: anomalyListing, reason, cursor: entry.next_cursor },
+      });
+      setAnomalies((prev) => [...prev, ...res.data.rows]);
+      setAnomalySummary((prev) => prev.map((item) => (
+        item.reason === reason ? { ...item, next_cursor: res.data.next_cursor } : item
+      )));
+    } catch (error) {
+      console.error('Error fetching anomalies:', error);
+    }
+  };
+
   const handlePageClick = (event) => {
     setCurrentPage(event.selected);
   };
@@ -212,6 +233,16 @@ const fetchTables = async () => {
         {anomalies.length > 0 && (
           <div className="mt-4">
             <h3>Anomalies Detected</h3>
+            <ul className="list-inline">
+              {anomalySummary.map((item) => (
+                <li key={item.reason} className="list-inline-item me-3">
+                  {item.label}: {item.count}
+                  {item.next_cursor && (
+                    <button className="btn btn-link btn-sm" onClick={() => loadMoreAnomalies(item.reason)}>Load more</button>
+                  )}
+                </li>
+              ))}
+            </ul>
             <table className="table table-bordered table-striped">
               <thead className="table-dark">
                 <tr>
@@ -33,8 +33,9 @@ const GraphPage = () => {
     const handleTableSelect = async (e) => {
         const selectedTable = e.target.value;
         setTableName(selectedTable);
+        setData({});
+        setChartTypes({});
         fetchColumns(selectedTable);
-        fetchData(selectedTable);
     };
 
     const fetchColumns = async (name) => {
@@ -42,14 +43,27 @@ const GraphPage = () => {
         setColumns(res.data.columns);
     };
 
-    const fetchData = async (table) => {
+    // Grouped server-side: top values per column plus an "Other" bucket
+    const fetchData = async (table, column) => {
         if (!table) return;
-        const res = await axios.get(`http://localhost:5000/table_summary?table_name=${table}`);
-        setData(res.data.summary);
+        const res = await axios.get('http://localhost:5000/aggregate', {
+            params: { table_name: table, group_by: column, agg: 'count', limit: 20 },
+        });
+        const { labels, values, other } = res.data;
+        setData((prev) => ({
+            ...prev,
+            [column]: {
+                labels: other ? [...labels, 'Other'] : labels,
+                values: other ? [...values, other.value] : values,
+            },
+        }));
     };
 
     const handleChartTypeChange = (column, type) => {
         setChartTypes((prev) => ({ ...prev, [column]: type }));
+        if (type && !data[column]) {
+            fetchData(tableName, column);
+        }
     };
 
     const [user, setUser] = useState(null);
@@ -135,7 +149,7 @@ const GraphPage = () => {
                     ))}
                 </select>
 
-                {Object.keys(data).length > 0 && (
+                {columns.length > 0 && (
                     <div>
                         <h3>Graphical Representation</h3>
                         {columns.map((col, index) => (
@@ -151,10 +165,10 @@ const GraphPage = () => {
                                 {data[col] && chartTypes[col] && (
                                     (() => {
                                         const chartData = {
-                                            labels: data[col].map(item => item[col]),
+                                            labels: data[col].labels,
                                             datasets: [{
                                                 label: col,
-                                                data: data[col].map(item => item.count),
+                                                data: data[col].values,
                                                 backgroundColor: ['#FF6384', '#36A2EB', '#FFCE56', '#4CAF50', '#9966FF'],
                                             }],
                                         };
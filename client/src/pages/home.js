@@ -14,11 +14,13 @@ const App = () => {
     const [data, setData] = useState([]);
     const [pageCount, setPageCount] = useState(0);
     const [currentPage, setCurrentPage] = useState(0);
+    const [pageCursors, setPageCursors] = useState({ next: null, prev: null });
     const [tableName, setTableName] = useState('');
     const [tables, setTables] = useState([]);
     const [editMode, setEditMode] = useState(false); // New state for toggle edit/display mode
     const [showDeleteModal, setShowDeleteModal] = useState(false);
     const [tableToDelete, setTableToDelete] = useState('');
+    const [uploadStatus, setUploadStatus] = useState(null);
 
     
     
@@ -31,14 +33,29 @@ const App = () => {
         formData.append('file', file);
         try {
             const response = await axios.post('http://localhost:5000/upload', formData, { withCredentials: true });
-            if (response.status === 200) {
-                fetchTables();
+            if (response.status === 202) {
+                pollUploadStatus(response.data.job_id);
             }
         } catch (error) {
             console.error(error);
         }
     };
 
+    // Poll the background upload job until it finishes
+    const pollUploadStatus = async (jobId) => {
+        try {
+            const res = await axios.get(`http://localhost:5000/upload_status/${jobId}`, { withCredentials: true });
+            setUploadStatus(res.data);
+            if (res.data.status === 'done') {
+                fetchTables();
+            } else if (res.data.status !== 'error') {
+                setTimeout(() => pollUploadStatus(jobId), 1000);
+            }
+        } catch (error) {
+            console.error('Error fetching upload status:', error);
+        }
+    };
+
     const fetchTables = async () => {
         try {
             const res = await axios.get('http://localhost:5000/get_tables', {
@@ -54,6 +71,7 @@ const App = () => {
         const selectedTable = e.target.value;
         setTableName(selectedTable);
         fetchColumns(selectedTable);
+        setCurrentPage(0);
         fetchData(0, selectedTable);
     };
 
@@ -63,7 +81,7 @@ const App = () => {
         setFilters({});
     };
 
-    const fetchData = async (page = 0, table = tableName, activeFilters = filters) => {
+    const fetchData = async (page = 0, table = tableName, activeFilters = filters, cursor = null, direction = 'next') => {
         if (!table) return;
 
         const res = await axios.post('http://localhost:5000/filter_data', {
@@ -71,20 +89,31 @@ const App = () => {
             filters: activeFilters,
             page: page + 1,
             limit: 10,
+            cursor,
+            direction,
         });
 
         setData(res.data.data);
+        setPageCursors({ next: res.data.next_cursor, prev: res.data.prev_cursor });
         setPageCount(Math.ceil(res.data.total_records / 10));
     };
 
     const handlePageClick = (event) => {
+        // Adjacent pages seek from the current page's cursor; jumps fall back to the page number
+        if (event.selected === currentPage + 1 && pageCursors.next) {
+            fetchData(event.selected, tableName, filters, pageCursors.next, 'next');
+        } else if (event.selected === currentPage - 1 && pageCursors.prev) {
+            fetchData(event.selected, tableName, filters, pageCursors.prev, 'prev');
+        } else {
+            fetchData(event.selected);
+        }
         setCurrentPage(event.selected);
-        fetchData(event.selected);
     };
 
     const handleFilterChange = (column, value) => {
         const newFilters = { ...filters, [column]: value };
         setFilters(newFilters);
+        setCurrentPage(0);
         fetchData(0, tableName, newFilters);
     };
 
@@ -220,6 +249,14 @@ const handleTableDelete = async () => {
                       <i className="fas fa-upload" style={{ fontSize: 12 }} /> Upload
                     </button>
                 </div>
+                {uploadStatus && (
+                    <div className={`alert ${uploadStatus.status === 'error' ? 'alert-danger' : 'alert-secondary'} py-2`}>
+                        {uploadStatus.table_name}: {uploadStatus.status}
+                        {' '}({uploadStatus.rows_inserted} rows, {Math.round(100 * uploadStatus.bytes_parsed / (uploadStatus.bytes_total || 1))}% parsed
+                        {uploadStatus.rows_per_second ? `, ${uploadStatus.rows_per_second} rows/s` : ''})
+                        {uploadStatus.error && <span> - {uploadStatus.error}</span>}
+                    </div>
+                )}
 
                 <div className="container mt-4">
                 <div className="mb-4">
@@ -339,6 +376,7 @@ const handleTableDelete = async () => {
                 <nav>
                     <ul className="pagination justify-content-center">
                         <ReactPaginate
+                            forcePage={currentPage}
                             previousLabel={'«'}
                             nextLabel={'»'}
                             breakLabel={'...'}